@@ -2,10 +2,45 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from model.params import params, initial_state
-from model.state_update_blocks import state_update_blocks
-from model.run import execute  # We'll need to adapt the notebook code into a module
+import io
+import os
+from model.jobs import QUEUED, DONE, CANCELLED, FAILED
+from model.service import ServiceClient, start_server
 import seaborn as sns
+import altair as alt
+
+# fixed seed so a repeated scenario is served from the result cache
+SEED = 0
+# relative confidence band width at which runs stop being added, provider
+# counts are noisy so they get a looser band
+TOLERANCE = {'token_price': 0.01, 'circulating_supply': 0.01, 'num_providers': 0.1}
+MAX_RUNS = 200
+# variables plotted by plot_results, the only ones kept in the history
+PLOTTED_VARIABLES = ['token_price', 'circulating_supply', 'demand', 'num_providers', 'total_capacity', 'service_price']
+# title and y axis of each variable's interactive chart
+CHART_LABELS = {
+    'token_price': ('Token Price Over Time', 'Price'),
+    'circulating_supply': ('Token Supply Over Time', 'Supply'),
+    'demand': ('Service Demand Over Time', 'Units of Capacity Demanded'),
+    'num_providers': ('Number of Providers Over Time', 'Number of Providers'),
+    'total_capacity': ('Total Units of Capacity Over Time', 'Units of Capacity'),
+    'service_price': ('Service Price Over Time', 'Price per Unit of Capacity')
+}
+# longer series are thinned to this many weeks before they are sent to the browser
+MAX_CHART_POINTS = 300
+
+
+@st.cache_resource
+def service_client():
+    """
+    client of the simulation service at DEPIN_SERVICE_URL (python -m
+    model.service), else of one started in this process. either way every
+    session shares its worker processes and finished results
+    """
+    url = os.environ.get('DEPIN_SERVICE_URL')
+    if url is None:
+        url = start_server(port=0).url
+    return ServiceClient(url)
 
 
 
@@ -86,9 +121,79 @@ def plot_results(results):
     
     return fig
 
+
+def compact_results(results):
+    """
+    the mean and std series of the plotted variables, a few kilobytes per
+    simulation instead of the frame or a live figure
+    """
+    return {
+        variable: {stat: results[(variable, stat)].to_numpy(dtype=np.float32) for stat in ['mean', 'std']}
+        for variable in PLOTTED_VARIABLES
+    }
+
+
+def chart_data(history, selected):
+    """
+    long-form mean and std band of every plotted variable for the selected
+    history entries (by run number), at most MAX_CHART_POINTS weeks each
+    """
+    frames = []
+    for run_number in selected:
+        results = history[run_number - 1]['results']
+        weeks = len(results[PLOTTED_VARIABLES[0]]['mean'])
+        index = np.unique(np.linspace(0, weeks - 1, min(weeks, MAX_CHART_POINTS)).round().astype(int))
+
+        for variable in PLOTTED_VARIABLES:
+            mean, std = results[variable]['mean'][index], results[variable]['std'][index]
+            frames.append(pd.DataFrame({
+                'run': f"Run #{run_number}",
+                'variable': variable,
+                'week': index,
+                'mean': mean,
+                'lower': mean - std,
+                'upper': mean + std
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def results_chart(data, variable):
+    """
+    mean line and std band per run on shared axes, drawn in the browser
+    """
+    title, ylabel = CHART_LABELS[variable]
+    base = alt.Chart(data[data['variable'] == variable], title=title).encode(
+        x=alt.X('week:Q', title='Weeks'),
+        color=alt.Color('run:N', title=None)
+    )
+    band = base.mark_area(opacity=0.2).encode(y='lower:Q', y2='upper:Q')
+    line = base.mark_line().encode(
+        y=alt.Y('mean:Q', title=ylabel),
+        tooltip=['run', 'week', alt.Tooltip('mean:Q', format='.4~g')]
+    )
+    return (band + line).interactive()
+
+
+@st.cache_data(max_entries=32)
+def render_results(results):
+    """
+    PNG of plot_results, shared by every session showing the same results.
+    the figure is closed as soon as it is drawn, so none stay in memory
+    """
+    fig = plot_results(results)
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
 # Initialize session state for storing simulation history
 if 'simulation_history' not in st.session_state:
     st.session_state.simulation_history = []
+# simulations submitted by this session that are queued, running or failed
+if 'pending_jobs' not in st.session_state:
+    st.session_state.pending_jobs = []
 
 # Streamlit UI
 
@@ -210,26 +315,89 @@ with main_tab:
             'initial_supply': initial_supply
         }
 
-        params_config = params(demand_type, macro_condition, max_mint, percent_burned)
-        initial_state_config = initial_state(initial_supply, demand_type)
-        
-        with st.spinner('Running simulations...'):
-            results = execute(params_config, initial_state_config, state_update_blocks, 52, 20)
-            fig = plot_results(results)
-            
-            # Add new simulation to history
-            st.session_state.simulation_history.append({
-                'parameters': current_params,
-                'figure': fig
-            })
-            
-            # Keep only the last 5 runs
-            if len(st.session_state.simulation_history) > 5:
-                st.session_state.simulation_history.pop(0)
+        # the simulation runs in the service, the fragment below polls it
+        job_id = service_client().submit(current_params, 52, seed=SEED, tolerance=TOLERANCE, max_runs=MAX_RUNS)
+        st.session_state.pending_jobs.append({'id': job_id, 'parameters': current_params})
+
+    def describe(parameters):
+        return ", ".join(f"{key}: {value}" for key, value in parameters.items())
+
+    @st.fragment(run_every=1)
+    def show_pending_jobs():
+        """
+        progress of this session's jobs, refreshed every second without
+        rerunning the page. finished jobs move to the history
+        """
+        client = service_client()
+        finished = False
+        for job in list(st.session_state.pending_jobs):
+            try:
+                status = client.status(job['id'])
+            except KeyError:
+                # the service was restarted and lost the job
+                status = {'state': FAILED, 'error': 'the simulation service lost this job'}
+
+            if status['state'] == DONE:
+                try:
+                    results = client.result(job['id'])
+                except LookupError:
+                    status = {'state': FAILED, 'error': 'the simulation service lost the result of this job'}
+
+            if status['state'] == DONE:
+                st.session_state.simulation_history.append({
+                    'parameters': job['parameters'],
+                    'results': compact_results(results),
+                    'runs': results.attrs['runs'],
+                    'converged': results.attrs['converged']
+                })
+                # Keep only the last 5 runs
+                if len(st.session_state.simulation_history) > 5:
+                    st.session_state.simulation_history.pop(0)
+            elif status['state'] != CANCELLED:
+                col1, col2 = st.columns([5, 1])
+                with col1:
+                    if status['state'] == FAILED:
+                        st.error(f"Simulation failed ({describe(job['parameters'])}): {status['error']}")
+                    elif status['state'] == QUEUED:
+                        st.progress(0.0, text=f"Queued: {describe(job['parameters'])}")
+                    else:
+                        fraction = min(status['done'] / status['total'], 1.0) if status['total'] else 0.0
+                        st.progress(fraction, text=f"{status['done']} runs (up to {status['total']}): {describe(job['parameters'])}")
+                with col2:
+                    label = 'Dismiss' if status['state'] == FAILED else 'Cancel'
+                    if not st.button(label, key=f"cancel-{job['id']}"):
+                        continue
+                    if status['state'] != FAILED:
+                        try:
+                            client.cancel(job['id'])
+                        except KeyError:
+                            pass
+
+            st.session_state.pending_jobs.remove(job)
+            finished = True
+
+        if finished:
+            st.rerun(scope='app')
+
+    if st.session_state.pending_jobs:
+        show_pending_jobs()
 
     # Display simulation history or default image
     if st.session_state.simulation_history:
         st.markdown("---")
+        history = st.session_state.simulation_history
+        interactive = st.toggle('Interactive charts', value=True, help='Overlay runs on shared, zoomable axes drawn in the browser')
+        if interactive:
+            run_numbers = list(range(len(history), 0, -1))
+            selected = st.multiselect('Compare runs', run_numbers, default=run_numbers, format_func=lambda n: f"Run #{n}")
+            if selected:
+                data = chart_data(history, selected)
+                columns = st.columns(2)
+                for index, variable in enumerate(PLOTTED_VARIABLES):
+                    with columns[index % 2]:
+                        st.altair_chart(results_chart(data, variable), use_container_width=True)
+            st.markdown("---")
+
         # st.write(f"***Showing {len(st.session_state.simulation_history)} most recent simulation runs in order***")
         for i, run in enumerate(reversed(st.session_state.simulation_history)):
             run_number = len(st.session_state.simulation_history) - i
@@ -244,9 +412,11 @@ with main_tab:
             with col2:
                 st.write("Percent Burned:", run['parameters']['percent_burned'])
                 st.write("Initial Supply:", run['parameters']['initial_supply'])
+            st.caption(f"{run['runs']} Monte Carlo runs" + ("" if run['converged'] else " (run limit reached before the confidence bands converged)"))
             
-            # Display the plot
-            st.pyplot(run['figure'])
+            # Display the plot, interactive charts are shown together above
+            if not interactive:
+                st.image(render_results(run['results']))
             
             # Add a divider between runs
             if i < len(st.session_state.simulation_history) - 1:
@@ -295,7 +465,7 @@ with faq_tab:
     ```
                             
     Each of these blocks involves several state updates and additional logic that replicates the behavior of the protocol. For each timestep (1 week), we loop through our blocks. 
-    The simulation is run for 52 weeks, 20 times. The results are aggregated and plotted, with the shaded area representing the variance.
+    The simulation is run for 52 weeks, repeated until the confidence bands of token price, supply and provider count settle (at most 200 times). The results are aggregated and plotted, with the shaded area representing the variance.
                 
     As the user of this simulations, you can input your own tokenomics and scenarios. Although the actual 'inputs' include dozens of parameters and exogenous conditions, 
     we fixed most of them to create a 'default' scenario, leaving the most relevant parameters to be tuned by the user of this interface. 
@@ -313,7 +483,7 @@ with faq_tab:
     relatively fixed within a certain range, these parameters should be tuned carefully to produce realistic rates of inflation. To tweak the demand profiles, feel free to fork the repo
     and fully customize it to your needs.
         - The default inputs should give a good idea of relative differences between these parameters that produce a 'normal' rate of inflation™. 
-        - This can of course be solved analytically, but we leave that as an Exercise For The Reader™.
+        - This can of course be solved analytically, but we leave that as an Exercise For The Reader™. Or search for it numerically with `model/optimize.py` in the repo.
     - Protocol designers can test their inputs in different scenarios and tweak them to find the theoretical conditions that are optimal for their protocol.
         - This can include A/B testing deflation vs. inflation, BME vs. inflationary, novel token burn/mint ratios, etc.
     - Macro conditions  put a positive or negative bias on the fundamental value of the token (net flows). This can be useful to test the robustness of the protocol.
@@ -0,0 +1,169 @@
+"""
+scaling benchmarks.
+
+measures wall time, peak RSS and per-week cost of execute() while varying one
+of T, R and provider_inflow_rate at a time around a base case, for every
+demand scenario and engine. each case runs in a fresh process, so its peak RSS
+is not inflated by earlier cases.
+
+    python -m benchmarks.scaling --out bench.json
+    python -m benchmarks.scaling --engine batched --T 52 1040 --R 1 1000
+    python -m benchmarks.scaling --compare old.json new.json
+
+results are written as JSON with the commit and environment they came from,
+so runs on two commits can be diffed case by case with --compare.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model.options import ENGINES, RunOptions
+from model.sweep import DEMAND_TYPES, run_config
+
+# the tokenomics of every case, demand_type comes from the case
+CONFIG = {'macro_condition': 'sideways', 'max_mint': 3500, 'percent_burned': 0.5, 'initial_supply': 1_000_000}
+BASE = {'T': 52, 'R': 20, 'provider_inflow_rate': 10}
+AXES = {
+    'T': [52, 104, 260, 520, 1040],
+    'R': [1, 10, 100, 1000],
+    'provider_inflow_rate': [10, 100, 1000, 10000]
+}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def run_case(case):
+    """
+    runs one case, in a worker process started for it
+    """
+    config = {**CONFIG, 'demand_type': case['demand_type']}
+    options = RunOptions(engine=case['engine'], seed=case['seed'], processes=case['processes'])
+    baseline_rss = peak_rss_mb()
+
+    start_time = time.perf_counter()
+    df = run_config(config, case['T'], case['R'], options, params_overrides={'provider_inflow_rate': case['provider_inflow_rate']})
+    seconds = time.perf_counter() - start_time
+
+    return {
+        **case,
+        'seconds': seconds,
+        'seconds_per_week': seconds / case['T'],
+        'seconds_per_run_week': seconds / (case['T'] * case['R']),
+        'peak_rss_mb': peak_rss_mb(),
+        'baseline_rss_mb': baseline_rss,
+        'final_num_providers': float(df[('num_providers', 'mean')].iloc[-1])
+    }
+
+
+def cases(engines, demand_types, axes, seed, processes):
+    """
+    one case per axis value with the other axes at BASE, the base case
+    itself is only listed once per engine and demand type
+    """
+    seen = set()
+    for engine in engines:
+        for demand_type in demand_types:
+            for axis, values in axes.items():
+                for value in values:
+                    case = {**BASE, axis: value}
+                    key = (engine, demand_type, case['T'], case['R'], case['provider_inflow_rate'])
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    yield {'engine': engine, 'demand_type': demand_type, **case, 'seed': seed, 'processes': processes}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def benchmark(engines, demand_types, axes, seed=0, processes=1, log=print):
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases(engines, demand_types, axes, seed, processes):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_case, case).result()
+        results.append(result)
+        log(
+            f"{result['engine']:8} {result['demand_type']:14} T={result['T']:<5} R={result['R']:<5} "
+            f"inflow={result['provider_inflow_rate']:<6g} {result['seconds']:9.2f}s "
+            f"{result['seconds_per_week'] * 1000:9.2f}ms/week {result['peak_rss_mb']:8.0f}MB"
+        )
+
+    return {'environment': environment(), 'results': results}
+
+
+def case_key(result):
+    return (result['engine'], result['demand_type'], result['T'], result['R'], result['provider_inflow_rate'])
+
+
+def compare(old, new, log=print):
+    """
+    prints the time and memory ratio new/old of every case in both files
+    """
+    old_results = {case_key(result): result for result in old['results']}
+    log(f"{old['environment']['commit']} -> {new['environment']['commit']}")
+    for result in new['results']:
+        before = old_results.get(case_key(result))
+        if before is None:
+            continue
+        log(
+            f"{result['engine']:8} {result['demand_type']:14} T={result['T']:<5} R={result['R']:<5} "
+            f"inflow={result['provider_inflow_rate']:<6g} time x{result['seconds'] / before['seconds']:6.2f} "
+            f"rss x{result['peak_rss_mb'] / before['peak_rss_mb']:6.2f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--engine', nargs='+', default=ENGINES, choices=ENGINES)
+    parser.add_argument('--demand-type', nargs='+', default=DEMAND_TYPES, choices=DEMAND_TYPES)
+    parser.add_argument('--T', nargs='+', type=int, default=AXES['T'])
+    parser.add_argument('--R', nargs='+', type=int, default=AXES['R'])
+    parser.add_argument('--inflow', nargs='+', type=float, default=AXES['provider_inflow_rate'])
+    parser.add_argument('--processes', type=int, default=1, help='radCAD worker processes per case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='benchmark.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files and exit')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare(json.load(f_old), json.load(f_new))
+        return
+
+    axes = {'T': args.T, 'R': args.R, 'provider_inflow_rate': args.inflow}
+    report = benchmark(args.engine, args.demand_type, axes, args.seed, args.processes)
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {len(report['results'])} results to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
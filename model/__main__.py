@@ -0,0 +1,104 @@
+"""
+headless batch runner.
+
+runs the scenarios of one or more scenario files (see scenarios.py) and
+writes each scenario's aggregated frame to <out>/<name>.csv and the timing of
+every scenario to <out>/runs.json.
+
+    python -m model scenarios/bme.toml --out results/bme
+    python -m model a.toml b.yaml --processes 8 --R 500 --engine batched
+
+a single scenario gets all the worker processes for its radCAD runs, several
+scenarios run side by side with one process each. exits with status 1 if any
+scenario failed, after running the others.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+
+from .cache import ResultCache
+from .options import ENGINES
+from .scenarios import load_scenarios, run_scenario
+from .store import ResultStore
+from .sweep import write_frame
+
+
+def _run_and_write(scenario, processes, cache, store, out_dir):
+    path = os.path.join(out_dir, f"{scenario['name']}.csv")
+    return {**scenario, **write_frame(path, run_scenario, scenario, processes, cache, store)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m model', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('files', nargs='+', help='TOML or YAML scenario files')
+    parser.add_argument('--out', default='results/cli', help='output directory')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--T', type=int, help='override the weeks of every scenario')
+    parser.add_argument('--R', type=int, help='override the runs of every scenario')
+    parser.add_argument('--seed', type=int, help='override the seed of every scenario')
+    parser.add_argument('--engine', choices=ENGINES, help='override the engine of every scenario')
+    parser.add_argument('--cache', action='store_true', help='read and write the result cache in .cache/results')
+    parser.add_argument('--store', help='also write runs and aggregates to a result store in this directory')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format='%(asctime)s %(message)s')
+    # radCAD logs every run it starts
+    logging.getLogger('radCAD').setLevel(logging.WARNING)
+
+    overrides = {key: getattr(args, key) for key in ('T', 'R', 'seed', 'engine') if getattr(args, key) is not None}
+    try:
+        scenarios = [{**scenario, **overrides} for path in args.files for scenario in load_scenarios(path)]
+    except (OSError, ValueError, ImportError, tomllib.TOMLDecodeError) as error:
+        parser.error(str(error))
+    names = [scenario['name'] for scenario in scenarios]
+    if len(set(names)) < len(names):
+        parser.error(f"scenario names must be unique, got {names}")
+
+    os.makedirs(args.out, exist_ok=True)
+    cache = ResultCache() if args.cache else None
+    store = ResultStore(args.store) if args.store else None
+
+    entries, failed = [], []
+    start_time = time.perf_counter()
+    if len(scenarios) == 1:
+        outcomes = [(scenarios[0], lambda: _run_and_write(scenarios[0], args.processes, cache, store, args.out))]
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(args.processes, len(scenarios)))
+        outcomes = [(scenario, pool.submit(_run_and_write, scenario, 1, cache, store, args.out).result) for scenario in scenarios]
+
+    try:
+        for scenario, result in outcomes:
+            try:
+                entry = result()
+            except Exception:
+                logging.exception(f"scenario {scenario['name']} failed")
+                failed.append(scenario['name'])
+                continue
+            entries.append(entry)
+            logging.info(f"{entry['name']}: T={entry['T']} R={entry['R']} {entry['engine']} in {entry['seconds']:.2f}s -> {entry['file']}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    report = {
+        'seconds': time.perf_counter() - start_time,
+        'processes': args.processes,
+        'scenarios': entries,
+        'failed': failed
+    }
+    with open(os.path.join(args.out, 'runs.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"{len(entries)} scenarios written to {args.out} in {report['seconds']:.2f}s")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,4 @@
-import numpy as np
-from model.provider import Provider
+from model.utils import stream
 def generate_providers(params, substep, state_history, prev_state):
     """
     generates providers based on the scenario params. we model this as a 
@@ -7,29 +6,25 @@ def generate_providers(params, substep, state_history, prev_state):
 
     """
     
+    rng = stream(params, 'providers')
     inflow_rate = params.get('provider_inflow_rate', 1)
+    exit_rule = params.get('provider_exit_rule', 'last')
+    onboarding = params.get('provider_onboarding', 'sample')
     providers = prev_state['providers']
 
-    # draw the size of the candidate pool
-    num_candidates = np.random.poisson(inflow_rate)
-    candidates = [Provider() for _ in range(num_candidates)]
+    # candidates arrive and decide to join (see ProviderPool.onboard and
+    # CohortPool.onboard)
+    joined = providers.onboard(prev_state, inflow_rate, rng, onboarding)
 
-    joined = []
+    decision = providers.decide_to_stay(prev_state, exit_rule)
+    sold = decision['sold']
 
-    for candidate in candidates:
-        if candidate.decide_onboard(prev_state):
-            joined.append(candidate)
+    staying = providers.select(decision['decision'])
+    new_providers = staying.concat(joined)
     
-    leaving = []
-    sold = 0
-
-    for provider in providers:
-        decision = provider.decide_to_stay(prev_state)
-        if not decision['decision']:
-            leaving.append(provider)
-            sold += decision['sold']
-
-    
-    new_providers = [p for p in providers if p not in leaving] + joined
-    
-    return {'joined_providers': new_providers, 'leaving_sold': sold}
+    return {
+        'joined_providers': new_providers,
+        'leaving_sold': sold,
+        'joined_count': len(joined),
+        'left_count': len(providers) - len(staying)
+    }
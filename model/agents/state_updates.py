@@ -13,7 +13,7 @@ def update_total_capacity(params, substep, state_history, prev_state, policy_inp
     """
     new_providers = policy_input['joined_providers']
 
-    new_capacity = sum([p.capacity for p in new_providers])
+    new_capacity = new_providers.total_capacity
 
     return ('total_capacity', new_capacity)
 
@@ -23,4 +23,22 @@ def update_leaving_provider_selling(params, substep, state_history, prev_state,
     """
     sold = policy_input['leaving_sold']
 
-    return ('net_flow', -sold)
\ No newline at end of file
+    return ('net_flow', -sold)
+
+def update_providers_joined(params, substep, state_history, prev_state, policy_input):
+    """
+    records how many candidates joined this week
+    """
+    return ('providers_joined', policy_input['joined_count'])
+
+def update_providers_left(params, substep, state_history, prev_state, policy_input):
+    """
+    records how many providers left this week
+    """
+    return ('providers_left', policy_input['left_count'])
+
+def update_provider_rewards(params, substep, state_history, prev_state, policy_input):
+    """
+    stores the providers after they have been rewarded and sold for costs
+    """
+    return ('providers', policy_input['providers'])
\ No newline at end of file
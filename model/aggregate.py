@@ -0,0 +1,90 @@
+"""
+streaming per-timestep aggregation.
+
+RunningStats keeps count, mean, M2 (sum of squared deviations), min and max
+for every (timestep, variable) pair and folds in new values as runs finish,
+merging batches with Chan et al.'s parallel update. memory is O(T x variables)
+no matter how many runs are added, and two RunningStats can be merged, e.g.
+from separate workers. nan values (e.g. avg_capacity with no providers) are
+skipped, as pandas does.
+"""
+import numpy as np
+import pandas as pd
+
+
+class RunningStats:
+    def __init__(self, variables, T):
+        self.variables = list(variables)
+        shape = (T + 1, len(self.variables))
+
+        self.count = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+
+    def _merge(self, rows, count, mean, m2, minimum, maximum):
+        n_a = self.count[rows]
+        n = n_a + count
+        delta = mean - self.mean[rows]
+        share = np.divide(count, n, out=np.zeros_like(n), where=n > 0)
+
+        self.mean[rows] += delta * share
+        self.m2[rows] += m2 + delta ** 2 * n_a * share
+        self.count[rows] = n
+        self.min[rows] = np.fmin(self.min[rows], minimum)
+        self.max[rows] = np.fmax(self.max[rows], maximum)
+
+    def _add(self, rows, values):
+        # values has runs on the first axis
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        total = np.where(valid, values, 0).sum(axis=0)
+        mean = np.divide(total, count, out=np.zeros(count.shape), where=count > 0)
+        m2 = (np.where(valid, values - mean, 0) ** 2).sum(axis=0)
+
+        self._merge(
+            rows, count, mean, m2,
+            np.where(valid, values, np.inf).min(axis=0),
+            np.where(valid, values, -np.inf).max(axis=0)
+        )
+
+    def add_runs(self, values):
+        """
+        folds in whole runs, values has shape (runs, T + 1, variables)
+        """
+        self._add(slice(None), np.asarray(values, dtype=float))
+
+    def add_timestep(self, t, values):
+        """
+        folds in one timestep of several runs, values has shape (runs, variables)
+        """
+        self._add(t, np.asarray(values, dtype=float))
+
+    def merge(self, other):
+        """
+        folds in the statistics gathered by another RunningStats
+        """
+        self._merge(slice(None), other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def std(self) -> np.ndarray:
+        """
+        sample standard deviation, nan below two values
+        """
+        return np.sqrt(np.divide(self.m2, self.count - 1, out=np.full(self.m2.shape, np.nan), where=self.count > 1))
+
+    def frame(self) -> pd.DataFrame:
+        """
+        returns the statistics in the layout of a groupby('timestep')
+        .agg(['mean', 'std']) frame
+        """
+        mean = np.where(self.count > 0, self.mean, np.nan)
+        std = self.std
+
+        columns = {('timestep', ''): np.arange(len(self.count))}
+        for i, variable in enumerate(self.variables):
+            columns[(variable, 'mean')] = mean[:, i]
+            columns[(variable, 'std')] = std[:, i]
+
+        return pd.DataFrame(columns)
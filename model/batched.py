@@ -0,0 +1,347 @@
+"""
+batched monte carlo engine.
+
+instead of handing runs to radCAD one at a time, every run is moved forward
+together: scalar state variables are (R,) arrays and the provider population
+is a set of (R, N_max) arrays padded with inactive slots. each week applies the
+same three blocks as state_update_blocks.py (macro and provider flow, protocol,
+price), so R=1000 costs about as much as a handful of radCAD runs.
+"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from .aggregate import RunningStats
+from .metrics import HEAVY_VARIABLES, extract, result_variables
+from .options import RunOptions
+from .profiling import Timed
+from .utils import STREAMS
+from .provider import CAPACITY_MU, CAPACITY_SIGMA, COST_HIGH, COST_LOW, ProviderPool, lookback_weeks, window_reward
+
+
+class BatchedProviders:
+    """
+    provider attributes for R runs, one row per run. inactive slots hold
+    zero capacity and cost so row sums need no mask
+    """
+    def __init__(self, pool, R, lookback_weeks):
+        n = len(pool)
+        size = max(n, 16)
+
+        self.capacity = np.zeros((R, size))
+        self.cost_per_unit = np.zeros((R, size))
+        self.token_balance = np.zeros((R, size))
+        # weeks on the first axis so the window reductions stay contiguous
+        self.reward_window = np.full((lookback_weeks, R, size), np.nan)
+        self.active = np.zeros((R, size), dtype=bool)
+
+        self.capacity[:, :n] = pool.capacity
+        self.cost_per_unit[:, :n] = pool.cost_per_unit
+        self.token_balance[:, :n] = pool.token_balance
+        self.reward_window[:, :, :n] = pool.recent_rewards(lookback_weeks).T[:, None, :]
+        self.active[:, :n] = True
+        # next free slot in each run, slots of leavers are reused on compaction
+        self.size = np.full(R, n)
+        # reward_window is a ring buffer, this column holds the latest week
+        self.latest = lookback_weeks - 1
+
+    @property
+    def count(self) -> np.ndarray:
+        return self.active.sum(axis=1)
+
+    @property
+    def total_capacity(self) -> np.ndarray:
+        return self.capacity.sum(axis=1)
+
+    def masked(self):
+        """
+        view for the metric extractors, inactive slots set to nan
+        """
+        return SimpleNamespace(
+            capacity=np.where(self.active, self.capacity, np.nan),
+            token_balance=np.where(self.active, self.token_balance, np.nan)
+        )
+
+    def _grow(self, needed):
+        size = self.capacity.shape[1]
+        if needed <= size:
+            return
+        while size < needed:
+            size *= 2
+        pad = ((0, 0), (0, size - self.capacity.shape[1]))
+        self.capacity = np.pad(self.capacity, pad)
+        self.cost_per_unit = np.pad(self.cost_per_unit, pad)
+        self.token_balance = np.pad(self.token_balance, pad)
+        self.reward_window = np.pad(self.reward_window, ((0, 0),) + pad, constant_values=np.nan)
+        self.active = np.pad(self.active, pad)
+
+    def _compact(self):
+        """
+        moves each run's active providers to the front and shrinks the arrays
+        once leavers have left most slots empty
+        """
+        count = self.count
+        if self.size.max() <= 2 * max(count.max(), 8):
+            return
+
+        order = np.argsort(~self.active, axis=1, kind='stable')
+        size = max(16, 2 * int(count.max()))
+        order = order[:, :size]
+
+        self.capacity = np.take_along_axis(self.capacity, order, axis=1)
+        self.cost_per_unit = np.take_along_axis(self.cost_per_unit, order, axis=1)
+        self.token_balance = np.take_along_axis(self.token_balance, order, axis=1)
+        self.reward_window = np.take_along_axis(self.reward_window, order[None], axis=2)
+        self.active = np.take_along_axis(self.active, order, axis=1)
+        self.size = count
+
+    def join(self, run, capacity, cost_per_unit):
+        """
+        appends providers to the runs given by run, which must be sorted
+        """
+        R = len(self.size)
+        joined = np.bincount(run, minlength=R)
+        self._grow(int((self.size + joined).max()))
+
+        # position of each joiner within its own run
+        offsets = np.cumsum(joined) - joined
+        slot = self.size[run] + np.arange(len(run)) - offsets[run]
+
+        self.capacity[run, slot] = capacity
+        self.cost_per_unit[run, slot] = cost_per_unit
+        self.active[run, slot] = True
+        self.size += joined
+
+    def leave(self, rule) -> dict:
+        """
+        vectorized ProviderPool.decide_to_stay, drops the leavers and returns
+        the tokens they sell and how many left in each run
+        """
+        cost = self.cost_per_unit * self.capacity
+        reward = window_reward(self.reward_window, rule, self.latest, axis=0)
+        profit = np.where(np.isnan(reward), cost + 1, reward) - cost
+
+        leaving = self.active & (profit <= 0)
+        sold = np.where(leaving, self.token_balance, 0).sum(axis=1)
+
+        self.capacity[leaving] = 0
+        self.cost_per_unit[leaving] = 0
+        self.token_balance[leaving] = 0
+        self.reward_window[:, leaving] = np.nan
+        self.active[leaving] = False
+        self._compact()
+
+        return {'sold': sold, 'left': leaving.sum(axis=1)}
+
+    def reward(self, reward_rate, token_price) -> np.ndarray:
+        """
+        vectorized ProviderPool.get_reward, returns the tokens each run's
+        providers sell to cover their weekly costs
+        """
+        reward = reward_rate[:, None] * self.capacity
+        tokens_sold = self.cost_per_unit * self.capacity / token_price[:, None]
+
+        self.latest = (self.latest + 1) % len(self.reward_window)
+        self.reward_window[self.latest] = np.where(self.active, reward * token_price[:, None], np.nan)
+        self.token_balance += reward - tokens_sold
+
+        return tokens_sold.sum(axis=1)
+
+
+def macro_and_provider_flow(params, state, t, streams):
+    """
+    vectorized generate_providers, generate_weekly_demand, update_macro and
+    update_demand
+    """
+    R = len(state['token_price'])
+
+    # demand policy
+    service_price = state['service_price']
+    demand_type = params.get('demand_type', 1)
+    price_elasticity = params.get('demand_price_elasticity', 1)
+    noise = streams['demand'].uniform(0.97, 1.03, size=R)
+    base_demand = params.get('base_demand', 1)
+
+    price_adjustment = np.exp(-0.5 * price_elasticity * np.log(service_price))
+
+    if demand_type == 'consistent':
+        demand = base_demand * price_adjustment * noise
+    elif demand_type == 'growth':
+        growth_rate = params.get('demand_growth_rate', .001)
+        demand = state['demand'] * (1 + growth_rate * price_adjustment) * noise
+    elif demand_type == 'high_to_decay':
+        decay_rate = params.get('demand_decay_rate', 1)
+        demand = base_demand * np.exp(-decay_rate * t) * price_adjustment * noise
+    elif demand_type == 'volatile':
+        volatility = params.get('demand_volatility', 1)
+        demand = base_demand * (1 + streams['demand'].uniform(-volatility, volatility, size=R)) * price_adjustment * noise
+    else:
+        raise ValueError(f"Invalid demand type: {demand_type}")
+
+    # provider policy: poisson candidates per run, joiners pass decide_onboard
+    # (or are drawn directly, see ProviderPool.onboard) and current providers
+    # check their rewards against their costs
+    providers = state['providers']
+    inflow_rate = params.get('provider_inflow_rate', 1)
+    onboarding = params.get('provider_onboarding', 'sample')
+    if onboarding == 'sample':
+        num_candidates = streams['providers'].poisson(inflow_rate, size=R)
+        run = np.repeat(np.arange(R), num_candidates)
+        capacity = streams['providers'].lognormal(CAPACITY_MU, CAPACITY_SIGMA, size=len(run))
+        cost_per_unit = streams['providers'].uniform(COST_LOW, COST_HIGH, size=len(run))
+
+        revenue = state['token_price'][run] * state['reward_rate'][run] * capacity
+        joining = revenue > cost_per_unit * capacity
+    elif onboarding == 'thinned':
+        break_even = np.clip(state['token_price'] * state['reward_rate'], COST_LOW, COST_HIGH)
+        p = (break_even - COST_LOW) / (COST_HIGH - COST_LOW)
+
+        run = np.repeat(np.arange(R), streams['providers'].poisson(inflow_rate * p))
+        capacity = streams['providers'].lognormal(CAPACITY_MU, CAPACITY_SIGMA, size=len(run))
+        cost_per_unit = streams['providers'].uniform(COST_LOW, break_even[run])
+        joining = np.ones(len(run), dtype=bool)
+    else:
+        raise ValueError(f"Invalid onboarding mode: {onboarding}")
+
+    leaving = providers.leave(params.get('provider_exit_rule', 'last'))
+    providers.join(run[joining], capacity[joining], cost_per_unit[joining])
+
+    # macro update
+    macro_condition = params.get('macro_condition', 1)
+    if macro_condition == 'bullish':
+        macro = streams['macro'].uniform(0.995, 1.011, size=R)
+    elif macro_condition == 'bearish':
+        macro = streams['macro'].uniform(0.995, 1.0049, size=R)
+    else:
+        macro = streams['macro'].uniform(0.998, 1.002, size=R)
+
+    demand_macro_sensitivity = params.get('demand_macro_sensitivity', 1)
+
+    state['demand'] = demand * (1 + state['macro'] * demand_macro_sensitivity)
+    state['macro'] = macro
+    state['total_capacity'] = providers.total_capacity
+    state['net_flow'] = -leaving['sold']
+    state['providers_joined'] = np.bincount(run[joining], minlength=R)
+    state['providers_left'] = leaving['left']
+
+
+def protocol(params, state, streams):
+    """
+    vectorized protocol_service and the protocol block state updates
+    """
+    R = len(state['token_price'])
+    capacity = state['total_capacity']
+    price = state['token_price']
+    max_mint = params.get('max_mint', 1)
+    percent_burned = params.get('percent_burned', 0)
+
+    tokens_bought = state['demand'] * state['service_price'] / price
+    tokens_burned = tokens_bought * percent_burned
+    minted_tokens = np.minimum(tokens_bought, max_mint)
+
+    reward_rate = np.divide(minted_tokens, capacity, out=np.zeros(R), where=capacity > 0)
+    tokens_sold = state['providers'].reward(reward_rate, price)
+
+    # service price from the market clearing price
+    base_demand = params.get('base_demand', 1)
+    price_elasticity = params.get('demand_price_elasticity', 1)
+    cost_floor = params.get('cost_floor', 0.1)
+    cost_ceiling = params.get('cost_ceiling', 1)
+
+    noise = streams['service'].uniform(0.97, 1.03, size=R)
+    with np.errstate(divide='ignore'):
+        market_clearing_price = (capacity / (base_demand * noise)) ** (-1 / price_elasticity)
+
+    state['circulating_supply'] = state['circulating_supply'] + minted_tokens - tokens_burned
+    state['reward_rate'] = reward_rate
+    state['service_price'] = np.clip(market_clearing_price, cost_floor, cost_ceiling)
+    state['net_flow'] = state['net_flow'] + tokens_bought - tokens_sold
+    state['tokens_bought'] = tokens_bought
+    state['tokens_sold'] = tokens_sold
+
+
+def price(params, state):
+    """
+    vectorized get_token_price and update_token_price
+    """
+    flows_sensitivity = params.get('tp_flows_sensitivity', 1)
+    flows_factor = np.exp(flows_sensitivity * state['net_flow'] / state['circulating_supply'])
+
+    state['token_price'] = state['token_price'] * flows_factor * state['macro']
+
+
+def run_batched(params, initial_state, T, R, options=None, writer=None, profiler=None, first_run=0, checkpoints=None, resume=False):
+    """
+    runs R monte carlo runs of T weeks together and folds every week into
+    RunningStats (and writer, if given) as it is simulated, so no history is
+    kept. all runs draw from one generator seeded with options.seed, with
+    options.crn each source of randomness (utils.STREAMS) has its own.
+    with a profiler the three blocks and the recording are timed. runs are
+    numbered from first_run + 1. with checkpoints, the state of all runs, the
+    generators and the statistics are saved as one snapshot, and resume
+    continues from it
+    """
+    options = options or RunOptions(engine='batched')
+    seed, metrics = options.seed, options.metrics
+    if options.crn:
+        root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        children = np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key).spawn(len(STREAMS))
+        streams = {name: np.random.default_rng(child) for name, child in zip(STREAMS, children)}
+    else:
+        streams = dict.fromkeys(STREAMS, np.random.default_rng(seed))
+    pool = initial_state['providers']
+    if not isinstance(pool, ProviderPool):
+        raise ValueError(f"the batched engine simulates individual providers, not {type(pool).__name__}")
+    variables = result_variables(initial_state, metrics)
+    state_variables = [key for key in initial_state if key not in HEAVY_VARIABLES]
+
+    state = {key: np.full(R, initial_state[key], dtype=float) for key in state_variables}
+    state['providers'] = BatchedProviders(pool, R, lookback_weeks(params))
+
+    stats = RunningStats(variables, T)
+    # radCAD's bookkeeping columns, substep 3 is the last block of a week
+    index = {'simulation': np.zeros(R), 'subset': np.zeros(R), 'run': np.arange(first_run + 1, first_run + R + 1)}
+
+    def record(t):
+        values = {
+            **state,
+            **index,
+            'substep': np.full(R, 3 if t > 0 else 0),
+            **extract({'providers': state['providers'].masked()}, metrics)
+        }
+        values = np.column_stack([values[variable] for variable in variables])
+        stats.add_timestep(t, values)
+        if writer is not None:
+            writer.add_timestep(t, values)
+
+    flow, service, pricing = macro_and_provider_flow, protocol, price
+    if profiler is not None:
+        flow = Timed('macro and provider flow', flow, profiler.memory)
+        service = Timed('protocol', service, profiler.memory)
+        pricing = Timed('price', pricing, profiler.memory)
+        record = Timed('record', record, profiler.memory)
+        start_time = time.perf_counter()
+
+    snapshot = checkpoints.load('batched') if resume else None
+    if snapshot is None:
+        start = 0
+        record(0)
+    else:
+        start, state, stats = snapshot['timestep'], snapshot['state'], snapshot['stats']
+        for generator, generator_state in zip(streams.values(), snapshot['rng']):
+            generator.bit_generator.state = generator_state
+
+    for t in range(start + 1, T + 1):
+        flow(params, state, t, streams)
+        service(params, state, streams)
+        pricing(params, state)
+        record(t)
+
+        if checkpoints is not None and checkpoints.due(t, T):
+            checkpoints.save('batched', {'timestep': t, 'state': state, 'rng': [generator.bit_generator.state for generator in streams.values()], 'stats': stats})
+
+    if profiler is not None:
+        steps = [flow, service, pricing, record]
+        profiler.add({step.label: step.counters() for step in steps}, time.perf_counter() - start_time)
+
+    return stats
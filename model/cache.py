@@ -0,0 +1,144 @@
+"""
+content-addressed on-disk cache of post-processed simulation results.
+
+a result is keyed by a hash of everything that determines it: params,
+initial state (including the provider or cohort arrays), T, R, the run
+options except processes and deepcopy (which do not change results) and the
+source code of the model package, so editing the model invalidates old
+entries. frames are stored as parquet files named by their key. reading an
+entry refreshes its modification time and the least recently used files are
+evicted once the directory grows past max_bytes.
+
+unseeded runs are never cached, since they are not reproducible.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cohort import CohortPool
+from .provider import ProviderPool
+from .utils import AtomicPath
+
+
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    """
+    hash of every python source file in the model package
+    """
+    h = hashlib.sha256()
+    root = Path(__file__).parent
+    for path in sorted(root.rglob('*.py')):
+        h.update(str(path.relative_to(root)).encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def _update(h, value):
+    if isinstance(value, dict):
+        for key in sorted(value):
+            h.update(repr(key).encode())
+            _update(h, value[key])
+    elif isinstance(value, (ProviderPool, CohortPool)):
+        for name, array in sorted(vars(value).items()):
+            h.update(name.encode())
+            _update(h, array)
+    elif isinstance(value, np.ndarray):
+        h.update(f"{value.dtype}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update(h, item)
+    else:
+        h.update(repr(value).encode())
+
+
+def result_key(params, initial_state, T, R, options) -> str:
+    """
+    stable hash of a simulation's inputs and the RunOptions that change its
+    result. the per-run generators in params['rng'] and params['streams']
+    are derived from the seed and left out
+    """
+    h = hashlib.sha256()
+    _update(h, {
+        'params': {key: value for key, value in params.items() if key not in ('rng', 'streams')},
+        'initial_state': initial_state,
+        'T': T,
+        'R': R,
+        'seed': options.seed,
+        'engine': options.engine,
+        'metrics': list(options.metrics),
+        'crn': options.crn,
+        'antithetic': options.antithetic,
+        'code': code_version()
+    })
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory='.cache/results', max_bytes=512 * 2**20):
+        # max_bytes=None keeps every entry
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """
+        returns the cached frame for key, or None
+        """
+        path = self._path(key)
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return df
+
+    def put(self, key, df):
+        """
+        stores df under key, then evicts least recently used entries
+        """
+        with AtomicPath(self._path(key)) as tmp_path:
+            df.to_parquet(tmp_path)
+
+        if self.max_bytes is not None:
+            self.evict()
+
+    def evict(self):
+        """
+        removes least recently used entries until the cache fits max_bytes
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.parquet'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.parquet'):
+                os.remove(entry.path)
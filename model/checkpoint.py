@@ -0,0 +1,86 @@
+"""
+on-disk checkpoints for long simulations.
+
+every `every` weeks (and at the end) each radCAD run writes a snapshot of its
+latest state, the state of its random generator and the values recorded so
+far; the batched engine writes one snapshot of all runs together with its
+running statistics. only the latest snapshot of each run is kept.
+
+execute(..., resume_from=...) rebuilds every run from its snapshot and
+continues it. the generators are restored bit for bit, so a resumed
+simulation gives exactly the result of an uninterrupted one. snapshots are
+pickled, the provider pool is a handful of numpy arrays so they stay small.
+"""
+import os
+import pickle
+
+from .utils import AtomicPath
+
+
+class Checkpoints:
+    def __init__(self, directory, every=52):
+        self.directory = directory
+        self.every = every
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.pkl")
+
+    def due(self, timestep, T) -> bool:
+        return timestep % self.every == 0 or timestep == T
+
+    def save(self, name, snapshot):
+        """
+        replaces the snapshot stored under name
+        """
+        with AtomicPath(self._path(name)) as tmp_path, open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, name):
+        """
+        returns the snapshot stored under name, or None
+        """
+        try:
+            with open(self._path(name), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def runs(self):
+        """
+        indices of the radCAD runs with a snapshot, in order
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        names = [entry.name for entry in os.scandir(self.directory)]
+        return sorted(int(name[4:-4]) for name in names if name.startswith('run-') and name.endswith('.pkl'))
+
+    def start(self, key, entropy, metrics=()):
+        """
+        clears old snapshots and records which simulation the new ones
+        belong to: the hash of its inputs and the entropy of its seed, so
+        unseeded simulations can be resumed too, and the names of the
+        metrics the snapshots' values hold
+        """
+        self.clear()
+        self.save('meta', {'key': key, 'entropy': entropy, 'every': self.every, 'metrics': list(metrics)})
+
+    def resume(self, key):
+        """
+        returns the seed entropy of the checkpointed simulation, after
+        checking it was started with the same inputs
+        """
+        meta = self.load('meta')
+        if meta is None:
+            raise FileNotFoundError(f"no checkpoints in {self.directory}")
+        if meta['key'] != key:
+            raise ValueError(f"checkpoints in {self.directory} belong to a simulation with different inputs")
+
+        self.every = meta['every']
+        return meta['entropy']
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                os.remove(entry.path)
@@ -0,0 +1,264 @@
+"""
+cohort-based provider model.
+
+a CohortPool groups providers into cohorts on a fixed grid of cost per unit
+and capacity bins. each cohort tracks how many providers it holds, their
+total capacity, their total weekly cost in usd, their total token balance and
+a rolling window of the usd reward per unit of capacity. it has the
+interface of ProviderPool, so the policies run either model unchanged, and
+every operation costs O(bins) whatever the number of providers.
+
+sums are exact: rewards and costs are proportional to capacity, so cohort
+rewards, token sales and balances equal the sums over their members. the
+approximations are in the decisions:
+
+    - a provider stays while its reward per unit beats its cost per unit
+      (capacity cancels), and a cohort decides as one on the average cost per
+      unit of its members. providers whose costs straddle the break-even
+      point within a bin all leave or all stay, so exits come in steps at most
+      one bin wide, (COST_HIGH - COST_LOW) / cost bins = 0.005 usd per unit
+      with the default 30 bins.
+    - joiners take on the reward window of the cohort they join. in the
+      agent model they are judged on their own rewards only, which matters
+      for the 'mean' and 'min' exit rules while rewards trend.
+    - new providers are not drawn one by one. the number joining each cohort
+      is poisson with the expected share of candidates in its bins that would
+      join, and each brings the mean capacity and cost of its bins, so the
+      spread of capacities inside a bin is lost.
+    - capacity quantiles are computed on cohort mean capacities, so they are
+      only as fine as the capacity bins.
+"""
+from math import erf, sqrt
+
+import numpy as np
+
+from .provider import CAPACITY_MU, CAPACITY_SIGMA, COST_HIGH, COST_LOW, ProviderPool, frozen, recent_weeks, window_reward
+
+COST_EDGES = np.linspace(COST_LOW, COST_HIGH, 31)
+# +-4 sigma of the capacity distribution, allowing for the initial pool's
+# capacity bias. the outer bins also hold the tails
+CAPACITY_EDGES = np.exp(np.linspace(CAPACITY_MU - 4 * CAPACITY_SIGMA, CAPACITY_MU + 4 * CAPACITY_SIGMA + np.log(1.3), 17))
+
+
+def _normal_cdf(x):
+    return np.array([0.5 * (1 + erf(value / sqrt(2))) for value in np.ravel(x)]).reshape(np.shape(x))
+
+
+def capacity_bin_moments(edges):
+    """
+    probability that a new provider's capacity falls in each bin (the outer
+    bins including the tails) and its mean capacity given that it does
+    """
+    log_edges = np.log(edges)
+    log_edges[0], log_edges[-1] = -np.inf, np.inf
+
+    cdf = _normal_cdf((log_edges - CAPACITY_MU) / CAPACITY_SIGMA)
+    # partial expectation of the lognormal over each bin
+    partial = _normal_cdf((log_edges - CAPACITY_MU - CAPACITY_SIGMA ** 2) / CAPACITY_SIGMA)
+
+    probability = np.diff(cdf)
+    mean = np.exp(CAPACITY_MU + CAPACITY_SIGMA ** 2 / 2) * np.diff(partial) / probability
+    return probability, mean
+
+
+# moments of the default capacity bins, computed once rather than every week
+CAPACITY_MOMENTS = capacity_bin_moments(CAPACITY_EDGES)
+
+
+class CohortPool:
+    def __init__(self, count=None, capacity=None, cost=None, token_balance=None, reward_window=None, cost_edges=COST_EDGES, capacity_edges=CAPACITY_EDGES):
+        self.cost_edges = cost_edges
+        self.capacity_edges = capacity_edges
+        # cohorts are ordered cost bin major, capacity bin minor
+        bins = (len(cost_edges) - 1) * (len(capacity_edges) - 1)
+
+        self.count = frozen(np.zeros(bins) if count is None else count)
+        self.capacity = frozen(np.zeros(bins) if capacity is None else capacity)
+        # weekly cost in usd, the sum of cost per unit times capacity
+        self.cost = frozen(np.zeros(bins) if cost is None else cost)
+        self.token_balance = frozen(np.zeros(bins) if token_balance is None else token_balance)
+        # usd reward per unit of capacity, one column per week, oldest first
+        self.reward_window = frozen(np.empty((bins, 0)) if reward_window is None else reward_window)
+
+    @classmethod
+    def from_pool(cls, pool, cost_edges=COST_EDGES, capacity_edges=CAPACITY_EDGES):
+        """
+        bins the providers of a ProviderPool into cohorts
+        """
+        cost_bin = np.clip(np.searchsorted(cost_edges, pool.cost_per_unit, side='right') - 1, 0, len(cost_edges) - 2)
+        capacity_bin = np.clip(np.searchsorted(capacity_edges, pool.capacity, side='right') - 1, 0, len(capacity_edges) - 2)
+        cohort = cost_bin * (len(capacity_edges) - 1) + capacity_bin
+        bins = (len(cost_edges) - 1) * (len(capacity_edges) - 1)
+
+        def total(weights):
+            return np.bincount(cohort, weights=weights, minlength=bins)
+
+        window = pool.reward_window
+        if window.shape[1] > 0:
+            # members of a cohort share its window, take their mean per unit
+            per_unit = window / pool.capacity[:, None]
+            rewarded = ~np.isnan(per_unit)
+            sums = np.stack([total(np.where(rewarded[:, week], per_unit[:, week], 0)) for week in range(window.shape[1])], axis=1)
+            weeks = np.stack([total(rewarded[:, week].astype(float)) for week in range(window.shape[1])], axis=1)
+            window = np.where(weeks > 0, sums / np.maximum(weeks, 1), np.nan)
+        else:
+            window = None
+
+        return cls(
+            total(np.ones(len(pool))),
+            total(pool.capacity),
+            total(pool.cost_per_unit * pool.capacity),
+            total(pool.token_balance),
+            window,
+            cost_edges,
+            capacity_edges
+        )
+
+    @classmethod
+    def sample(cls, n, rng=np.random, capacity_bias=1):
+        """
+        draws n new providers like ProviderPool.sample and bins them
+        """
+        return cls.from_pool(ProviderPool.sample(n, rng, capacity_bias))
+
+    def __len__(self):
+        return int(self.count.sum())
+
+    def __str__(self):
+        return f"CohortPool(size={len(self)}, cohorts={int((self.count > 0).sum())}, total_capacity={self.total_capacity}, token_balance={self.token_balance.sum()})"
+
+    @property
+    def total_capacity(self) -> float:
+        return float(self.capacity.sum())
+
+    @property
+    def cost_per_unit(self) -> np.ndarray:
+        """
+        average cost per unit of each cohort, nan for empty cohorts
+        """
+        return np.divide(self.cost, self.capacity, out=np.full(len(self.cost), np.nan), where=self.capacity > 0)
+
+    def replace(self, **changes):
+        attributes = {
+            'count': self.count,
+            'capacity': self.capacity,
+            'cost': self.cost,
+            'token_balance': self.token_balance,
+            'reward_window': self.reward_window,
+            'cost_edges': self.cost_edges,
+            'capacity_edges': self.capacity_edges
+        }
+        return CohortPool(**{**attributes, **changes})
+
+    def select(self, mask):
+        """
+        returns a pool where the cohorts outside mask are emptied
+        """
+        return self.replace(
+            count=np.where(mask, self.count, 0),
+            capacity=np.where(mask, self.capacity, 0),
+            cost=np.where(mask, self.cost, 0),
+            token_balance=np.where(mask, self.token_balance, 0),
+            reward_window=np.where(mask[:, None], self.reward_window, np.nan)
+        )
+
+    def concat(self, other):
+        """
+        returns a pool with the providers of other added to their cohorts.
+        joiners take on the window of a cohort that already has members
+        """
+        width = max(self.reward_window.shape[1], other.reward_window.shape[1])
+        window = np.where((self.count > 0)[:, None], self.recent_rewards(width), other.recent_rewards(width))
+
+        return self.replace(
+            count=self.count + other.count,
+            capacity=self.capacity + other.capacity,
+            cost=self.cost + other.cost,
+            token_balance=self.token_balance + other.token_balance,
+            reward_window=window
+        )
+
+    def recent_rewards(self, weeks) -> np.ndarray:
+        return recent_weeks(self.reward_window, weeks)
+
+    def get_profit(self, price, rule='last') -> np.ndarray:
+        """
+        profit of each cohort in usd, judged on its reward per unit against
+        its average cost per unit. nan for empty cohorts
+        """
+        reward = window_reward(self.recent_rewards(max(self.reward_window.shape[1], 1)), rule)
+        cost_per_unit = self.cost_per_unit
+
+        # cohorts with no rewards yet always stay
+        reward = np.where(np.isnan(reward), cost_per_unit + 1, reward)
+        return (reward - cost_per_unit) * self.capacity
+
+    def sell_for_costs(self, price):
+        tokens_sold = self.cost / price
+
+        return {
+            'providers': self.replace(token_balance=self.token_balance - tokens_sold),
+            'sold': float(tokens_sold.sum())
+        }
+
+    def decide_to_stay(self, state, rule='last'):
+        """
+        cohorts stay or leave as one, leavers sell their whole balance
+        """
+        with np.errstate(invalid='ignore'):
+            staying = (self.count == 0) | (self.get_profit(state['token_price'], rule) > 0)
+        sold = float(self.token_balance[~staying].sum())
+
+        return {
+            'decision': staying,
+            'sold': sold
+        }
+
+    def onboard(self, state, inflow_rate, rng=np.random, mode='thinned'):
+        """
+        returns the pool of new providers: candidates join while the reward
+        per unit beats their cost per unit, so the joiners in each cohort are
+        poisson with the candidates' expected share there, bringing the mean
+        capacity and cost of their bins. cohorts are always thinned, mode is
+        accepted for the ProviderPool interface
+        """
+        reward_per_unit = state['token_price'] * state['reward_rate']
+
+        # share of each cost bin below the break-even cost, and their mean cost
+        low, high = self.cost_edges[:-1], self.cost_edges[1:]
+        joining_high = np.clip(reward_per_unit, low, high)
+        cost_share = (joining_high - low) / (COST_HIGH - COST_LOW)
+        cost_mean = (low + joining_high) / 2
+
+        if np.array_equal(self.capacity_edges, CAPACITY_EDGES):
+            capacity_share, capacity_mean = CAPACITY_MOMENTS
+        else:
+            capacity_share, capacity_mean = capacity_bin_moments(self.capacity_edges)
+
+        expected = inflow_rate * np.outer(cost_share, capacity_share).ravel()
+        count = rng.poisson(expected).astype(float)
+        capacity = count * np.tile(capacity_mean, len(cost_mean))
+        cost = capacity * np.repeat(cost_mean, len(capacity_mean))
+
+        return self.replace(
+            count=count,
+            capacity=capacity,
+            cost=cost,
+            token_balance=np.zeros(len(count)),
+            reward_window=np.empty((len(count), 0))
+        )
+
+    def get_reward(self, state, reward, lookback_weeks=1):
+        """
+        cohorts get rewards (one entry per cohort) and cover their costs,
+        returns the rewarded pool and the total sold
+        """
+        per_unit = np.divide(reward * state['token_price'], self.capacity, out=np.full(len(reward), np.nan), where=self.capacity > 0)
+        window = np.hstack([self.recent_rewards(lookback_weeks - 1), per_unit[:, None]])
+
+        rewarded = self.replace(
+            reward_window=window,
+            token_balance=self.token_balance + reward
+        )
+
+        return rewarded.sell_for_costs(state['token_price'])
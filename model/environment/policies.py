@@ -1,4 +1,6 @@
 import numpy as np
+from model.provider import lookback_weeks
+from model.utils import stream
 
 def generate_weekly_demand(params, substep, state_history, prev_state) -> float:
     """
@@ -8,10 +10,11 @@ def generate_weekly_demand(params, substep, state_history, prev_state) -> float:
 
     macro effect is added in the state update fn
     """
+    rng = stream(params, 'demand')
     service_price = prev_state['service_price']
     type = params.get('demand_type', 1)
     price_elasticity = params.get('demand_price_elasticity', 1)
-    noise = np.random.uniform(0.97, 1.03)
+    noise = rng.uniform(0.97, 1.03)
     base_demand = params.get('base_demand', 1)
 
     price_adjustment = 1 / (service_price ** price_elasticity) if service_price > 0 else 1
@@ -25,11 +28,11 @@ def generate_weekly_demand(params, substep, state_history, prev_state) -> float:
         demand = prev_demand * (1 + growth_rate * price_adjustment) * noise
     elif type == 'high_to_decay':
         decay_rate = params.get('demand_decay_rate', 1)
-        t = len(state_history)
+        t = prev_state['timestep'] + 1
         demand = base_demand * np.exp(-decay_rate * t) * price_adjustment * noise
     elif type == 'volatile':
         volatility = params.get('demand_volatility', 1)
-        demand = base_demand * (1 + np.random.uniform(-volatility, volatility)) * price_adjustment * noise
+        demand = base_demand * (1 + rng.uniform(-volatility, volatility)) * price_adjustment * noise
     else:
         raise ValueError(f"Invalid demand type: {type}")
     return {'demand': demand}
@@ -67,6 +70,7 @@ def protocol_service(params, substep, state_history, prev_state):
     price = prev_state['token_price']
     max_mint = params.get('max_mint', 1)
     percent_burned = params.get('percent_burned', 0)
+    lookback = lookback_weeks(params)
 
 
     tokens_bought = demand * service_price / price
@@ -74,14 +78,12 @@ def protocol_service(params, substep, state_history, prev_state):
     minted_tokens = min(tokens_bought, max_mint)
 
     reward_rate = minted_tokens / capacity if capacity > 0 else 0
-    tokens_sold = 0
-    
-    for provider in providers:
-       tokens_sold += provider.get_reward(prev_state, reward_rate * provider.capacity)
+    rewarded = providers.get_reward(prev_state, reward_rate * providers.capacity, lookback)
     
     return {
+            'providers': rewarded['providers'],
             'tokens_bought': tokens_bought,
-            'tokens_sold': tokens_sold,
+            'tokens_sold': rewarded['sold'],
             'reward_rate': reward_rate,
             'minted_tokens': minted_tokens,
             'burned_tokens': tokens_burned
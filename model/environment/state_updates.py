@@ -1,4 +1,4 @@
-import numpy as np
+from model.utils import stream
 
 
 def update_service_price(params, substep, state_history, prev_state, policy_input):
@@ -9,14 +9,16 @@ def update_service_price(params, substep, state_history, prev_state, policy_inpu
 
     where the macro adjustment is (macro_sensitivity * macro_t)
     """
+    rng = stream(params, 'service')
     capacity = prev_state['total_capacity']
     base_demand = params.get('base_demand', 1)
     price_elasticity = params.get('demand_price_elasticity', 1)
     cost_floor = params.get('cost_floor', 0.1)
     cost_ceiling = params.get('cost_ceiling', 1)
 
-    noise = np.random.uniform(0.97, 1.03)  # Optional: keep noise for some randomness
-    market_clearing_price = (capacity / (base_demand * noise)) ** (-1 / price_elasticity)
+    noise = rng.uniform(0.97, 1.03)  # Optional: keep noise for some randomness
+    # with no capacity left the clearing price is unbounded, so it sits at the ceiling
+    market_clearing_price = (capacity / (base_demand * noise)) ** (-1 / price_elasticity) if capacity > 0 else cost_ceiling
 
     # Ensure the price doesn't go below the cost floor
     new_price = max(min(market_clearing_price, cost_ceiling), cost_floor)
@@ -78,14 +80,15 @@ def update_macro(params, substep, state_history, prev_state, policy_input):
     """
     updates the macro based on the policy input
     """
+    rng = stream(params, 'macro')
     macro_condition = params.get('macro_condition', 1)
 
     if macro_condition == 'bullish':
-        macro = np.random.uniform(0.995, 1.011)
+        macro = rng.uniform(0.995, 1.011)
     elif macro_condition == 'bearish':
-        macro = np.random.uniform(0.995, 1.0049)
+        macro = rng.uniform(0.995, 1.0049)
     else:
-        macro = np.random.uniform(0.998, 1.002)
+        macro = rng.uniform(0.998, 1.002)
 
     return ('macro', macro)
 
@@ -0,0 +1,125 @@
+"""
+what-if branches from a mid-run snapshot.
+
+branch() simulates the weeks every variant has in common once and saves the
+state of each run at week t. fork() then continues every run from that
+state once per variant, simulating only weeks t+1..T. a variant is a dict of
+params overrides, optionally with a 'schedule' mapping a week to the
+overrides that take effect from that week on, e.g.
+
+    checkpoints = branch(params, initial_state, state_update_blocks, 26, R, 'branches/week-26', seed=0)
+    results = fork(params, state_update_blocks, checkpoints, 52, {
+        'baseline': {},
+        'cut_mint': {'max_mint': 1000},
+        'cut_mint_later': {'schedule': {40: {'max_mint': 1000}}}
+    })
+
+every variant starts from the same generator states, so variants differ only
+by their params (common random numbers). the prefix is loaded once and shared
+by all variants, and a ResultStore receives its trajectories once, under
+variant='prefix', with each variant's runs holding weeks t+1..T only.
+"""
+import logging
+import multiprocessing
+import time
+
+import numpy as np
+
+from .aggregate import RunningStats
+from .checkpoint import Checkpoints
+from .metrics import INDEX_VARIABLES, METRICS, result_variables
+from .options import RunOptions
+from .run import StreamingExecution, execute, map_executions, run_execution
+
+
+def branch(params, initial_state, state_update_blocks, t, R, directory, seed=None, processes=None, metrics=METRICS):
+    """
+    simulates weeks 1..t of R runs and saves every run's state at week t
+    """
+    checkpoints = Checkpoints(directory, every=t)
+    execute(params, initial_state, state_update_blocks, t, R, RunOptions(seed=seed, processes=processes, metrics=metrics), checkpoints=checkpoints)
+    return checkpoints
+
+
+def load_prefix(checkpoints):
+    """
+    the week t snapshots of every run, checking they were taken at the same week
+    """
+    snapshots = [checkpoints.load(f"run-{run}") for run in checkpoints.runs()]
+    if not snapshots:
+        raise FileNotFoundError(f"no run snapshots in {checkpoints.directory}")
+
+    timesteps = {snapshot['timestep'] for snapshot in snapshots}
+    if len(timesteps) > 1:
+        raise ValueError(f"runs in {checkpoints.directory} stopped at different weeks: {sorted(timesteps)}")
+    return snapshots
+
+
+def fork(params, state_update_blocks, checkpoints, T, variants, processes=None, metrics=METRICS, store=None, scenario=None):
+    """
+    continues every run saved by branch() to week T once per variant and
+    returns a dict of variant name to the frame execute would return. metrics
+    must be the ones the prefix was recorded with. a ResultStore partitions
+    the runs by scenario (if any) and the variant name
+    """
+    scenario = scenario or {}
+    snapshots = load_prefix(checkpoints)
+    recorded = (checkpoints.load('meta') or {}).get('metrics')
+    if recorded is not None and recorded != list(metrics):
+        raise ValueError(f"the prefix in {checkpoints.directory} was recorded with metrics {recorded}, not {list(metrics)}")
+    t = snapshots[0]['timestep']
+    if T <= t:
+        raise ValueError(f"T={T} must be after the branch week {t}")
+
+    state_variables = {key: None for key in snapshots[0]['state'] if key not in INDEX_VARIABLES + ['timestep']}
+    variables = result_variables(state_variables, metrics)
+
+    def execution(variant, snapshot):
+        overrides = {key: value for key, value in variant.items() if key != 'schedule'}
+        schedule = dict(variant.get('schedule', {}))
+        # changes scheduled up to the branch week apply from the start
+        for week in sorted(week for week in schedule if week <= t):
+            overrides.update(schedule.pop(week))
+
+        rng = np.random.default_rng()
+        rng.bit_generator.state = snapshot['rng']
+        return StreamingExecution(
+            timesteps=T - t,
+            initial_state=dict(snapshot['state']),
+            state_update_blocks=state_update_blocks,
+            params={**params, **overrides, 'rng': rng},
+            enable_deepcopy=False,
+            drop_substeps=True,
+            run_index=snapshot['state']['run'],
+            variables=variables,
+            metrics=metrics,
+            values=snapshot['values'],
+            schedule=schedule
+        )
+
+    executions = (execution(variant, snapshot) for variant in variants.values() for snapshot in snapshots)
+
+    if store is not None:
+        writer = store.writer({**scenario, 'variant': 'prefix'}, variables)
+        writer.add_runs(np.stack([snapshot['values'] for snapshot in snapshots]))
+        writer.close()
+        writers = {name: store.writer({**scenario, 'variant': name}, variables) for name in variants}
+
+    start_time = time.time()
+    stats = {name: RunningStats(variables, T) for name in variants}
+    names = [name for name in variants for _ in snapshots]
+    processes = processes or multiprocessing.cpu_count() - 1 or 1
+
+    for name, values in zip(names, map_executions(run_execution, executions, processes)):
+        stats[name].add_runs(values[None])
+        if store is not None:
+            writers[name].add_runs(values[None, t + 1:], start=t + 1)
+
+    logging.info(f"{len(variants)} variants of {len(snapshots)} runs forked at week {t} in {time.time() - start_time:.2f} seconds")
+
+    results = {name: stats[name].frame() for name in variants}
+    if store is not None:
+        for name in variants:
+            writers[name].close()
+            store.write_aggregates({**scenario, 'variant': name}, results[name])
+    return results
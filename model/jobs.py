@@ -0,0 +1,127 @@
+"""
+background simulation jobs.
+
+a JobQueue runs simulations in worker processes, so the caller (the app's
+script thread) never blocks on them. one queue is shared by every session of
+the app: jobs from all users are scheduled on the same bounded pool, up to
+`workers` at a time, and the rest wait in submission order.
+
+workers report progress after every finished run through a manager dict that
+the caller polls with status(). cancel() drops a job that has not started and
+stops a running one after its current run: the job's progress callback
+raises Cancelled, which unwinds execute like any other error.
+"""
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+from .options import RunOptions
+from .run import execute_adaptive
+from .sweep import config_inputs
+
+# job states reported by status()
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = 'queued', 'running', 'done', 'cancelled', 'failed'
+
+
+class Cancelled(Exception):
+    pass
+
+
+def simulate(config, T, seed=None, cache=None, processes=1, progress=None, engine='radcad', **settings):
+    """
+    runs the app's adaptive simulation of one form config (the keys of
+    sweep.grid), settings are passed on to execute_adaptive
+    """
+    from .state_update_blocks import state_update_blocks
+
+    params_config, initial_state_config = config_inputs(config, seed)
+    options = RunOptions(engine=engine, seed=seed, processes=processes)
+    return execute_adaptive(params_config, initial_state_config, state_update_blocks, T, options, cache=cache, progress=progress, **settings)
+
+
+def _run_job(job_id, function, args, kwargs, progress, cancelled):
+    def report(done, total):
+        if cancelled.get(job_id):
+            raise Cancelled(job_id)
+        progress[job_id] = (done, total)
+
+    report(0, 0)
+    try:
+        return function(*args, progress=report, **kwargs)
+    finally:
+        # a job discarded while running leaves its flag to be cleared here
+        if cancelled.pop(job_id, False):
+            progress.pop(job_id, None)
+
+
+class JobQueue:
+    def __init__(self, workers=None):
+        self.workers = workers or max(os.cpu_count() // 2, 1)
+        # spawned workers, forking the threaded app server is not safe
+        context = multiprocessing.get_context('spawn')
+        self.manager = context.Manager()
+        self.progress = self.manager.dict()
+        self.cancelled = self.manager.dict()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.jobs = {}
+
+    def submit(self, function, *args, **kwargs):
+        """
+        queues function(*args, progress=..., **kwargs) and returns the job id.
+        function and its arguments must be picklable
+        """
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = self.pool.submit(_run_job, job_id, function, args, kwargs, self.progress, self.cancelled)
+        return job_id
+
+    def status(self, job_id) -> dict:
+        """
+        state of the job, runs done and expected so far, and the error of a
+        failed job
+        """
+        future = self.jobs[job_id]
+        done, total = self.progress.get(job_id, (0, 0))
+        status = {'state': QUEUED, 'done': done, 'total': total, 'error': None}
+
+        if future.cancelled():
+            status['state'] = CANCELLED
+        elif future.done():
+            error = future.exception()
+            if error is None:
+                status['state'] = DONE
+            elif isinstance(error, Cancelled):
+                status['state'] = CANCELLED
+            else:
+                status.update(state=FAILED, error=repr(error))
+        elif job_id in self.progress:
+            status['state'] = RUNNING
+        return status
+
+    def result(self, job_id):
+        """
+        the return value of a finished job, raises for failed and cancelled jobs
+        """
+        try:
+            return self.jobs[job_id].result()
+        except CancelledError:
+            raise Cancelled(job_id) from None
+
+    def cancel(self, job_id):
+        future = self.jobs[job_id]
+        if not future.done() and not future.cancel():
+            self.cancelled[job_id] = True
+
+    def discard(self, job_id):
+        """
+        forgets a job, cancelling it if it has not finished
+        """
+        self.cancel(job_id)
+        del self.jobs[job_id]
+        self.progress.pop(job_id, None)
+
+    def shutdown(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        self.pool.shutdown(wait=True)
+        self.manager.shutdown()
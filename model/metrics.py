@@ -0,0 +1,117 @@
+"""
+metric extractors for heavy state variables.
+
+the provider population is too big to keep in the simulation output, so
+while the simulation runs each recorded week is reduced to the scalars
+registered in METRICS, and only those are kept. every entry maps a metric
+name to the state variable it reads and a function of that variable.
+
+extractors reduce over the last axis and treat nan as an empty slot, so the
+same functions work on a ProviderPool (one run) and on the batched engine's
+padded (R, N_max) arrays. a CohortPool holds cohorts instead of providers,
+so the provider metrics weight each cohort by its count. functions must be
+importable at module level (or functools.partial of one) so they can be sent
+to worker processes.
+"""
+import warnings
+from functools import partial
+
+import numpy as np
+
+from .cohort import CohortPool
+
+# state variables that are summarised instead of recorded
+HEAVY_VARIABLES = ['providers']
+# radCAD's bookkeeping columns, aggregated like the state variables
+INDEX_VARIABLES = ['simulation', 'subset', 'run', 'substep']
+
+
+def _nan_reduce(function, values, **kwargs):
+    # all-nan slices (no providers left) reduce to nan without a warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return function(values, axis=-1, **kwargs)
+
+
+def count(providers):
+    if isinstance(providers, CohortPool):
+        return len(providers)
+    return np.sum(~np.isnan(providers.capacity), axis=-1)
+
+
+def mean_capacity(providers):
+    if isinstance(providers, CohortPool):
+        return providers.total_capacity / len(providers) if len(providers) > 0 else np.nan
+    return _nan_reduce(np.nanmean, providers.capacity)
+
+
+def nan_quantile(values, q):
+    """
+    linear-interpolated quantile of the last axis ignoring nan, like
+    np.nanquantile but vectorized over the leading axes
+    """
+    n = np.sum(~np.isnan(values), axis=-1)
+    if values.shape[-1] == 0:
+        return np.full(n.shape, np.nan)
+
+    values = np.sort(values, axis=-1)  # nan sorts last
+    last = np.maximum(n - 1, 0)[..., None]
+    position = q * last
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, last)
+
+    below = np.take_along_axis(values, lower, axis=-1)
+    above = np.take_along_axis(values, upper, axis=-1)
+    quantile = (below + (above - below) * (position - lower))[..., 0]
+    return np.where(n > 0, quantile, np.nan)
+
+
+def cohort_quantile(pool, q):
+    """
+    quantile of the providers' capacities, taking every member of a cohort
+    to have the cohort's mean capacity
+    """
+    occupied = pool.count > 0
+    if not occupied.any():
+        return np.nan
+
+    capacity = pool.capacity[occupied] / pool.count[occupied]
+    order = np.argsort(capacity)
+    position = q * (pool.count[occupied].sum() - 1)
+    index = np.searchsorted(np.cumsum(pool.count[occupied][order]), position, side='right')
+    return capacity[order][min(index, len(order) - 1)]
+
+
+def capacity_quantile(providers, q):
+    if isinstance(providers, CohortPool):
+        return cohort_quantile(providers, q)
+    return nan_quantile(providers.capacity, q)
+
+
+def total_token_balance(providers):
+    return np.nansum(providers.token_balance, axis=-1)
+
+
+METRICS = {
+    'num_providers': ('providers', count),
+    'avg_capacity': ('providers', mean_capacity),
+    'capacity_p10': ('providers', partial(capacity_quantile, q=0.1)),
+    'capacity_p50': ('providers', partial(capacity_quantile, q=0.5)),
+    'capacity_p90': ('providers', partial(capacity_quantile, q=0.9)),
+    'total_token_balance': ('providers', total_token_balance),
+}
+
+
+def extract(state, metrics=METRICS):
+    """
+    returns the value of every metric for state
+    """
+    return {name: function(state[variable]) for name, (variable, function) in metrics.items()}
+
+
+def result_variables(initial_state, metrics=METRICS):
+    """
+    the numeric variables recorded for every timestep, in output order
+    """
+    state_variables = [key for key in initial_state if key not in HEAVY_VARIABLES]
+    return state_variables + INDEX_VARIABLES + list(metrics)
@@ -0,0 +1,139 @@
+"""
+tokenomics optimizer.
+
+searches max_mint, percent_burned and initial_supply (any subset of BOUNDS)
+for the values minimising an objective of the aggregated frame, for a fixed
+demand type and macro condition:
+
+    result = optimize(target_inflation(0.05), {'demand_type': 'growth', 'macro_condition': 'sideways'}, budget=300)
+    result['best'], result['objective'], result['trace']
+
+the search is a cross-entropy method: every iteration draws a population of
+candidates from a normal distribution over the scaled bounds, simulates them
+in parallel and moves the distribution part of the way towards the best
+few, which keeps it from collapsing onto an early lucky candidate. every
+candidate is simulated with the same seed on common random numbers
+(RunOptions(crn=True)), so candidates that onboard different numbers of
+providers still see the same macro, demand and service draws and the
+ranking is not decided by noise. the search
+stops once budget candidates have been simulated or the distribution has
+collapsed.
+
+objectives take the frame returned by execute and return a number to
+minimise. they run in this process, so they can be closures.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .options import RunOptions
+from .sweep import run_config
+from .utils import scale
+
+BOUNDS = {
+    'max_mint': (0, 20_000),
+    'percent_burned': (0.0, 1.0),
+    'initial_supply': (100_000, 10_000_000)
+}
+
+
+def annual_inflation(df) -> float:
+    """
+    growth of the mean circulating supply over the run, annualised
+    """
+    supply = df[('circulating_supply', 'mean')].to_numpy()
+    weeks = len(supply) - 1
+    return float((supply[-1] / supply[0]) ** (52 / weeks) - 1)
+
+
+def provider_retention(df) -> float:
+    """
+    mean number of providers at the end relative to the start
+    """
+    providers = df[('num_providers', 'mean')].to_numpy()
+    return float(providers[-1] / providers[0])
+
+
+def target_inflation(rate, min_retention=None, penalty=10.0):
+    """
+    objective: squared distance of annual inflation from rate, plus penalty
+    times the shortfall of provider retention below min_retention
+    """
+    def objective(df):
+        loss = (annual_inflation(df) - rate) ** 2
+        if min_retention is not None:
+            loss += penalty * max(min_retention - provider_retention(df), 0)
+        return loss
+
+    return objective
+
+
+def _candidates(mean, std, size, rng):
+    return np.clip(rng.normal(mean, std, size=(size, len(mean))), 0, 1)
+
+
+def optimize(objective, config, bounds=BOUNDS, T=52, R=100, budget=200, population=None, elite=0.25, smoothing=0.7, engine='batched', seed=0, cache=None, processes=None, tolerance=1e-3, progress=None):
+    """
+    minimises objective(execute frame) over bounds, the rest of each
+    candidate's config (the keys of sweep.grid) comes from config. budget
+    caps the number of simulated candidates, population defaults to the
+    number of processes (at least 16). progress is called with every trace
+    row. returns the best config, its objective, every evaluation and the
+    trace of the search, one row per iteration
+    """
+    processes = processes or os.cpu_count()
+    population = population or max(processes, 16)
+    n_elite = max(int(population * elite), 4)
+    rng = np.random.default_rng(seed)
+
+    # in the unit cube, starting from the whole box
+    mean = np.full(len(bounds), 0.5)
+    std = np.full(len(bounds), 0.5)
+
+    # one seed and its streams for every candidate: common random numbers
+    simulate = partial(run_config, T=T, R=R, options=RunOptions(engine=engine, seed=seed, processes=1, crn=True), cache=cache)
+
+    evaluations, trace = [], []
+    best = None
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        iteration = 0
+        while len(evaluations) < budget and std.max() > tolerance:
+            size = min(population, budget - len(evaluations))
+            unit = _candidates(mean, std, size, rng)
+            configs = [{**config, **point} for point in scale(bounds, unit)]
+
+            frames = pool.map(simulate, configs)
+            values = np.array([objective(df) for df in frames])
+
+            for candidate, value in zip(configs, values):
+                evaluations.append({**candidate, 'iteration': iteration, 'objective': value})
+                if best is None or value < best['objective']:
+                    best = {'config': candidate, 'objective': value}
+
+            order = np.argsort(values)[:n_elite]
+            if size >= n_elite:
+                mean = smoothing * unit[order].mean(axis=0) + (1 - smoothing) * mean
+                std = smoothing * unit[order].std(axis=0) + (1 - smoothing) * std
+
+            row = {
+                'iteration': iteration,
+                'evaluations': len(evaluations),
+                'iteration_best': float(values.min()),
+                'best': float(best['objective']),
+                **{f"best_{key}": best['config'][key] for key in bounds},
+                'spread': float(std.max())
+            }
+            trace.append(row)
+            if progress is not None:
+                progress(row)
+            iteration += 1
+
+    return {
+        'best': best['config'],
+        'objective': best['objective'],
+        'evaluations': pd.DataFrame(evaluations),
+        'trace': pd.DataFrame(trace)
+    }
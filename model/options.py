@@ -0,0 +1,40 @@
+"""
+how the runs of a simulation are executed.
+
+RunOptions groups the settings that execute, execute_adaptive and the two
+engines pass down to every run, so adding one does not widen every
+signature on the way:
+
+    execute(params, initial_state, state_update_blocks, 52, 100, RunOptions(engine='batched', seed=0, crn=True))
+"""
+from dataclasses import dataclass, field
+
+from .metrics import METRICS
+
+ENGINES = ['radcad', 'batched']
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """
+    engine='radcad' steps each run through the state update blocks with
+    radCAD, engine='batched' moves all runs forward together as numpy arrays.
+    processes caps radCAD's worker pool (1 runs in this process) and
+    deepcopy restores radCAD's per-substep copies, for checking results.
+    seed spawns every run's generator (see run.run_generators), crn and
+    antithetic reduce the variance of comparisons (see variance.py). metrics
+    summarise the heavy state variables (see metrics.py)
+    """
+    engine: str = 'radcad'
+    seed: object = None
+    processes: int = None
+    deepcopy: bool = False
+    crn: bool = False
+    antithetic: bool = False
+    metrics: dict = field(default_factory=lambda: METRICS)
+
+    def __post_init__(self):
+        if self.engine not in ENGINES:
+            raise ValueError(f"Invalid engine: {self.engine}")
+        if self.antithetic and self.engine == 'batched':
+            raise ValueError("antithetic runs are only supported by the radcad engine")
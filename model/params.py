@@ -1,4 +1,8 @@
-from .provider import Provider
+import numpy as np
+from .cohort import CohortPool
+from .provider import ProviderPool
+
+PROVIDER_MODELS = ['agents', 'cohorts']
 
 def params(demand_type: str, macro_condition: str, max_mint: int, percent_burned: float):
     
@@ -17,6 +21,9 @@ def params(demand_type: str, macro_condition: str, max_mint: int, percent_burned
     'demand_macro_sensitivity': 0.02,
     'cost_floor': 0.1,
     'cost_ceiling': 1,
+    'provider_lookback_weeks': 4,
+    'provider_exit_rule': 'mean',
+    'provider_onboarding': 'thinned',
     **demand
 }
 
@@ -59,10 +66,15 @@ def demand_scenarios(type: str):
         }
     
 
-def initial_state(initial_supply: float, demand_type: str):
+def initial_state(initial_supply: float, demand_type: str, seed=None, provider_model='agents'):
     demand = demand_scenarios(demand_type)
-    providers = [Provider(capacity_bias=1.3) for i in range(10)]
-    capacity = sum([p.capacity for p in providers])
+    providers = ProviderPool.sample(10, np.random.default_rng(seed), capacity_bias=1.3)
+    if provider_model == 'cohorts':
+        # for large populations, see cohort.py
+        providers = CohortPool.from_pool(providers)
+    elif provider_model not in PROVIDER_MODELS:
+        raise ValueError(f"Invalid provider model: {provider_model}")
+    capacity = providers.total_capacity
     
     return {
         'providers': providers,
@@ -75,5 +87,7 @@ def initial_state(initial_supply: float, demand_type: str):
         'total_capacity': capacity,
         'net_flow': 0,
         'tokens_bought': 0,
-        'tokens_sold': 0
+        'tokens_sold': 0,
+        'providers_joined': 0,
+        'providers_left': 0
     }
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+opt-in profiling of the state update blocks.
+
+instrument() returns a copy of state_update_blocks with every policy and
+state update function wrapped in a Timed callable that counts calls, wall time
+and, with memory=True, the bytes allocated per call as seen by tracemalloc.
+execute(..., profiler=Profiler()) runs the instrumented blocks and merges the
+counters of every run (including runs in worker processes) into the
+profiler, which then logs a ranked table and optionally writes it as JSON.
+
+without a profiler nothing is wrapped, so the model runs the plain functions.
+tracemalloc slows every allocation down, so wall times measured with
+memory=True are inflated; profile with memory=False for timings.
+"""
+import json
+import logging
+import time
+import tracemalloc
+
+# whether tracemalloc was started here rather than by the caller
+_started_tracing = False
+
+
+class Timed:
+    """
+    a policy or state update function that records its own calls. instances
+    are pickled to worker processes along with the blocks, so every run
+    collects its counters separately
+    """
+    def __init__(self, label, function, memory=True):
+        self.label = label
+        self.function = function
+        self.memory = memory
+        self.reset()
+
+    def counters(self):
+        return {'calls': self.calls, 'seconds': self.seconds, 'allocated': self.allocated}
+
+    def reset(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.allocated = 0
+
+    def __call__(self, *args):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                global _started_tracing
+                tracemalloc.start()
+                _started_tracing = True
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        start_time = time.perf_counter()
+        result = self.function(*args)
+        self.seconds += time.perf_counter() - start_time
+        self.calls += 1
+
+        if self.memory:
+            self.allocated += tracemalloc.get_traced_memory()[1] - start_memory
+        return result
+
+
+def stop_tracing():
+    """
+    stops tracemalloc if a Timed function started it, tracing the caller
+    started is left running
+    """
+    global _started_tracing
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+
+
+def instrument(state_update_blocks, memory=True):
+    """
+    copy of state_update_blocks with every function wrapped in Timed, labelled
+    '<block label>/policy/<name>' and '<block label>/variable/<name>'
+    """
+    blocks = []
+    for index, block in enumerate(state_update_blocks):
+        label = block.get('label', str(index))
+        blocks.append({
+            **block,
+            'policies': {name: Timed(f"{label}/policy/{name}", function, memory) for name, function in block['policies'].items()},
+            'variables': {name: Timed(f"{label}/variable/{name}", function, memory) for name, function in block['variables'].items()}
+        })
+    return blocks
+
+
+def collect(state_update_blocks):
+    """
+    returns and resets the counters of the Timed functions in the blocks,
+    empty for blocks that are not instrumented
+    """
+    counters = {}
+    for block in state_update_blocks:
+        for function in [*block['policies'].values(), *block['variables'].values()]:
+            if isinstance(function, Timed):
+                counters[function.label] = function.counters()
+                function.reset()
+    return counters
+
+
+class Profiler:
+    def __init__(self, memory=True, path=None):
+        self.memory = memory
+        self.path = path
+        self.counters = {}
+        # wall time of the runs themselves, the part not spent in the
+        # profiled functions is the engine's overhead
+        self.run_seconds = 0.0
+
+    def add(self, counters, run_seconds=0.0):
+        for label, counter in counters.items():
+            total = self.counters.setdefault(label, {'calls': 0, 'seconds': 0.0, 'allocated': 0})
+            for key, value in counter.items():
+                total[key] += value
+        self.run_seconds += run_seconds
+
+    def report(self):
+        """
+        one row per label, slowest first, plus the engine overhead
+        """
+        rows = [
+            {
+                'label': label,
+                'calls': counter['calls'],
+                'seconds': counter['seconds'],
+                'seconds_per_call': counter['seconds'] / counter['calls'] if counter['calls'] else 0.0,
+                'allocated_bytes': counter['allocated'] if self.memory else None
+            }
+            for label, counter in self.counters.items()
+        ]
+        overhead = self.run_seconds - sum(row['seconds'] for row in rows)
+        rows.append({'label': 'engine overhead', 'calls': None, 'seconds': overhead, 'seconds_per_call': None, 'allocated_bytes': None})
+
+        total = self.run_seconds or 1.0
+        for row in rows:
+            row['share'] = row['seconds'] / total
+        return sorted(rows, key=lambda row: row['seconds'], reverse=True)
+
+    def table(self) -> str:
+        lines = [f"{'label':50} {'calls':>8} {'seconds':>9} {'ms/call':>9} {'share':>6} {'allocated':>11}"]
+        for row in self.report():
+            calls = '' if row['calls'] is None else row['calls']
+            per_call = '' if row['seconds_per_call'] is None else f"{row['seconds_per_call'] * 1000:.3f}"
+            allocated = '' if row['allocated_bytes'] is None else f"{row['allocated_bytes'] / 2**20:.1f}MB"
+            lines.append(f"{row['label']:50} {calls:>8} {row['seconds']:9.3f} {per_call:>9} {row['share']:6.1%} {allocated:>11}")
+        return '\n'.join(lines)
+
+    def emit(self):
+        """
+        logs the table and writes the report to path, if set
+        """
+        stop_tracing()
+        logging.info(f"profile ({self.run_seconds:.2f}s in runs)\n{self.table()}")
+        if self.path is not None:
+            with open(self.path, 'w') as f:
+                json.dump({'run_seconds': self.run_seconds, 'memory': self.memory, 'rows': self.report()}, f, indent=2)
@@ -3,70 +3,232 @@ providers are initialized with the following:
     - an amount of weekly capacity they generate
     - their cost per unit of capacity in usd
     - their token balance in terms of the token
-    - a history of their weekly rewards
- 
+    - a rolling window of their last k weekly rewards in usd
+
 every week, they provide their service to the market at a protocol-set price and
-sell their capacity to the protocol, which rewards them for maintaining their service in the 
+sell their capacity to the protocol, which rewards them for maintaining their service in the
 protocol token.
 
 every week, they evaluate their rewards and decide whether to stay in the protocol or leave.
-when they leave, they sell their tokens on the market.
+the decision looks at the latest reward, or the mean or minimum over the window
+(provider_lookback_weeks / provider_exit_rule in params). when they leave, they sell
+their tokens on the market.
+
+the whole population is held as a ProviderPool: one numpy array per attribute
+(struct-of-arrays), so joining, rewarding, selling and leaving are vectorized
+over every provider at once instead of looping over python objects.
+
+pools are immutable: every operation returns a new pool and the arrays are
+read-only, so state can be shared between substeps without radCAD deep copies.
 """
 import numpy as np
 
-class Provider:
-    def __init__(self, capacity_bias=1):
-        self.capacity = np.random.lognormal(5, 0.7) * capacity_bias
-        self.cost_per_unit = np.random.uniform(0.05, 0.2)
-        self.token_balance = 0
-        self.reward_history = []
-        self.onboarded = False
-        
+# new providers draw capacity ~ lognormal(CAPACITY_MU, CAPACITY_SIGMA) and
+# cost per unit ~ uniform(COST_LOW, COST_HIGH)
+CAPACITY_MU = 5
+CAPACITY_SIGMA = 0.7
+COST_LOW = 0.05
+COST_HIGH = 0.2
+
+
+def window_reward(window, rule, latest=-1, axis=-1) -> np.ndarray:
+    """
+    reduces reward windows (weeks along axis, nan where not yet rewarded,
+    latest week at index `latest`) to the latest, mean or minimum reward.
+    nan where a provider has no rewards yet
+    """
+    if rule == 'last':
+        return np.take(window, latest, axis=axis)
+
+    rewarded = ~np.isnan(window)
+    weeks = rewarded.sum(axis=axis)
+
+    if rule == 'mean':
+        total = np.where(rewarded, window, 0).sum(axis=axis)
+        return np.where(weeks > 0, total / np.maximum(weeks, 1), np.nan)
+    elif rule == 'min':
+        return np.where(weeks > 0, np.where(rewarded, window, np.inf).min(axis=axis), np.nan)
+    else:
+        raise ValueError(f"Invalid exit rule: {rule}")
+
+
+def lookback_weeks(params) -> int:
+    """
+    provider_lookback_weeks of params, the number of weekly rewards kept in
+    the reward windows. at least the latest week is always kept
+    """
+    weeks = params.get('provider_lookback_weeks', 1)
+    if not isinstance(weeks, (int, np.integer)) or isinstance(weeks, bool) or weeks < 1:
+        raise ValueError(f"Invalid lookback weeks: {weeks}")
+    return int(weeks)
+
+
+def recent_weeks(window, weeks) -> np.ndarray:
+    """
+    the last `weeks` columns of a reward window (weeks along axis 1, oldest
+    first), padding weeks before the window started with nan
+    """
+    if weeks == 0:
+        return np.empty((len(window), 0))
+
+    window = window[:, -weeks:]
+    missing = weeks - window.shape[1]
+    return np.pad(window, ((0, 0), (missing, 0)), constant_values=np.nan)
+
+
+def frozen(values) -> np.ndarray:
+    """
+    read-only float array of values. arrays that can still be written to
+    are copied first, so freezing never locks the caller's own arrays
+    """
+    array = np.asarray(values, dtype=float)
+    if array.flags.writeable:
+        array = array.copy()
+    array.flags.writeable = False
+    return array
+
+
+class ProviderPool:
+    def __init__(self, capacity=(), cost_per_unit=(), token_balance=None, reward_window=None):
+        self.capacity = frozen(capacity)
+        self.cost_per_unit = frozen(cost_per_unit)
+
+        n = len(self.capacity)
+        self.token_balance = frozen(np.zeros(n) if token_balance is None else token_balance)
+        # one column per week, oldest first. nan for weeks before the provider joined
+        self.reward_window = frozen(np.empty((n, 0)) if reward_window is None else reward_window)
+
+    @classmethod
+    def sample(cls, n, rng=np.random, capacity_bias=1):
+        """
+        draws n new providers with random capacities and costs from rng
+        """
+        capacity = rng.lognormal(CAPACITY_MU, CAPACITY_SIGMA, size=n) * capacity_bias
+        cost_per_unit = rng.uniform(COST_LOW, COST_HIGH, size=n)
+        return cls(capacity, cost_per_unit)
+
+    def __len__(self):
+        return len(self.capacity)
 
     def __str__(self):
-        return f"Provider(capacity={self.capacity}, cost_per_unit={self.cost_per_unit}, token_balance={self.token_balance})"
+        return f"ProviderPool(size={len(self)}, total_capacity={self.total_capacity}, token_balance={self.token_balance.sum()})"
+
+    @property
+    def total_capacity(self) -> float:
+        return float(self.capacity.sum())
+
+    def replace(self, **changes):
+        """
+        returns a new pool with the given attribute arrays swapped in
+        """
+        attributes = {
+            'capacity': self.capacity,
+            'cost_per_unit': self.cost_per_unit,
+            'token_balance': self.token_balance,
+            'reward_window': self.reward_window
+        }
+        return ProviderPool(**{**attributes, **changes})
+
+    def select(self, mask):
+        """
+        returns a new pool holding only the providers where mask is true
+        """
+        return ProviderPool(
+            self.capacity[mask],
+            self.cost_per_unit[mask],
+            self.token_balance[mask],
+            self.reward_window[mask]
+        )
+
+    def concat(self, other):
+        """
+        returns a new pool with the providers of other appended
+        """
+        width = max(self.reward_window.shape[1], other.reward_window.shape[1])
+        return ProviderPool(
+            np.concatenate([self.capacity, other.capacity]),
+            np.concatenate([self.cost_per_unit, other.cost_per_unit]),
+            np.concatenate([self.token_balance, other.token_balance]),
+            np.concatenate([self.recent_rewards(width), other.recent_rewards(width)])
+        )
+
+    def recent_rewards(self, weeks) -> np.ndarray:
+        """
+        returns the last `weeks` columns of the reward window, padding
+        older weeks with nan
+        """
+        return recent_weeks(self.reward_window, weeks)
 
-    def get_profit(self, price) -> float:
+    def get_profit(self, price, rule='last') -> np.ndarray:
         """
-        returns the profit of the provider in usd. 
+        returns the profit of each provider in usd, judged on the latest
+        reward or the mean or minimum reward over the window.
         can be negative
         """
         cost = self.cost_per_unit * self.capacity
-        latest_reward = self.reward_history[-1][1] if len(self.reward_history) > 0 else cost + 1
-        return latest_reward - cost
-        # return self.token_balance > 0
+        reward = window_reward(self.recent_rewards(max(self.reward_window.shape[1], 1)), rule)
+
+        # providers with no rewards yet always stay
+        reward = np.where(np.isnan(reward), cost + 1, reward)
+        return reward - cost
+
     def sell_for_costs(self, price):
         """
-        sells tokens to cover their costs for the week 
+        sells tokens to cover their costs for the week, returns the new pool
+        and the total sold
         """
         cost_in_token = self.cost_per_unit * self.capacity
         tokens_sold = cost_in_token / price
-        self.token_balance -= tokens_sold
 
-        return tokens_sold
+        return {
+            'providers': self.replace(token_balance=self.token_balance - tokens_sold),
+            'sold': float(tokens_sold.sum())
+        }
 
-    def decide_to_stay(self, state):
+    def decide_to_stay(self, state, rule='last'):
         """
-        providers decide to stay or leave
+        providers decide to stay or leave, leavers sell their whole balance
         """
-        
-        staying = self.get_profit(state['token_price']) > 0
-        sold = 0
 
-        if not staying: 
-          sold = self.token_balance
-          self.onboarded = False
-          
-        
+        staying = self.get_profit(state['token_price'], rule) > 0
+        sold = float(self.token_balance[~staying].sum())
+
         return {
             'decision': staying,
             'sold': sold
         }
-    
 
-    def decide_onboard(self, state):
+
+    def onboard(self, state, inflow_rate, rng=np.random, mode='sample'):
+        """
+        returns the pool of new providers. mode='sample' draws a poisson
+        number of candidates and keeps those who decide to join.
+
+        a candidate joins when token_price * reward_rate beats its cost per
+        unit (capacity cancels out), which happens with probability p from
+        the uniform cost distribution. mode='thinned' draws the joiners
+        directly as poisson(inflow_rate * p), with costs uniform below the
+        break-even cost: the same distribution without drawing the
+        candidates who would not join
+        """
+        if mode == 'sample':
+            num_candidates = rng.poisson(inflow_rate)
+            candidates = ProviderPool.sample(num_candidates, rng)
+            return candidates.select(candidates.decide_onboard(state))
+        elif mode == 'thinned':
+            break_even = np.clip(state['token_price'] * state['reward_rate'], COST_LOW, COST_HIGH)
+            p = (break_even - COST_LOW) / (COST_HIGH - COST_LOW)
+
+            n = rng.poisson(inflow_rate * p)
+            capacity = rng.lognormal(CAPACITY_MU, CAPACITY_SIGMA, size=n)
+            cost_per_unit = rng.uniform(COST_LOW, break_even, size=n)
+            return ProviderPool(capacity, cost_per_unit)
+        else:
+            raise ValueError(f"Invalid onboarding mode: {mode}")
+
+    def decide_onboard(self, state) -> np.ndarray:
         """
-        candidates decide to join if the current token price times their 
+        candidates decide to join if the current token price times their
         capacity exceeds their cost per unit of capacity
         """
 
@@ -77,13 +239,18 @@ class Provider:
         cost = self.cost_per_unit * self.capacity
         return revenue > cost
 
-    def get_reward(self, state, reward):
+    def get_reward(self, state, reward, lookback_weeks=1):
         """
-        providers get rewards, cover their costs, and decide to stay or leave
+        providers get rewards (one entry per provider) and cover their costs,
+        returns the rewarded pool and the total sold. the window keeps only
+        the last lookback_weeks rewards
         """
-        self.reward_history.append((reward, reward * state['token_price']))
-        self.token_balance += reward
+        usd_reward = reward * state['token_price']
+        window = np.hstack([self.recent_rewards(lookback_weeks - 1), usd_reward[:, None]])
 
-        sold = self.sell_for_costs(state['token_price'])
+        rewarded = self.replace(
+            reward_window=window,
+            token_balance=self.token_balance + reward
+        )
 
-        return sold
\ No newline at end of file
+        return rewarded.sell_for_costs(state['token_price'])
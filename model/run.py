@@ -1,43 +1,344 @@
-from radcad import Simulation, Model, Engine, Experiment
-import pandas as pd
-from .params import params, initial_state
+from radcad.core import SimulationExecution
+from dataclasses import dataclass, replace
+import numpy as np
+from .aggregate import RunningStats
+from .metrics import METRICS, extract, result_variables
+from .batched import run_batched
+from .cache import result_key
+from .checkpoint import Checkpoints
+from .options import RunOptions
+from .profiling import collect, instrument, stop_tracing
+from .provider import lookback_weeks
+from .utils import STREAMS, Antithetic
+from statistics import NormalDist
+import multiprocessing
 import time
 import logging
 
-def execute(params, initial_state, state_update_blocks, T, R):
+# variables whose confidence bands decide when execute_adaptive stops
+CONVERGENCE_VARIABLES = ['token_price', 'circulating_supply', 'num_providers']
 
+def execute(params, initial_state, state_update_blocks, T, R, options=None, cache=None, store=None, scenario=None, profiler=None, checkpoints=None, resume_from=None, progress=None):
+    """
+    runs R monte carlo runs of T weeks as set by options (a RunOptions) and
+    returns the per-timestep statistics frame (see aggregate.py). the
+    ResultCache, ResultStore (partitioned by scenario), Profiler and
+    Checkpoints are optional; resume_from continues from checkpoints.
+    progress(done, total) is called as runs finish and stops the simulation
+    by raising
+    """
+    options = options or RunOptions()
+    lookback_weeks(params)
+    if store is not None and resume_from is not None:
+        raise ValueError("a resumed simulation cannot write its runs to a store")
 
-    model = Model(initial_state=initial_state, state_update_blocks=state_update_blocks, params=params)
-    simulation = Simulation(model=model, timesteps=T, runs=R)
-    experiment = Experiment([simulation])
-    experiment.engine.exceptions = False
-    experiment.engine.drop_substeps = True
-    experiment.engine.deepcopy = True
+    key = None
+    if cache is not None and options.seed is not None:
+        key = result_key(params, initial_state, T, R, options)
+        # the cache only holds aggregates, stored and profiled runs simulate
+        df = cache.get(key) if store is None and profiler is None else None
+        if df is not None:
+            logging.info(f"simulation loaded from cache {key[:12]}")
+            return df
 
+    resume = resume_from is not None
+    if resume and not isinstance(resume_from, Checkpoints):
+        resume_from = Checkpoints(resume_from)
+    checkpoints = resume_from if resume else checkpoints
+
+    if checkpoints is not None:
+        # the seed's entropy is saved with the checkpoints, so unseeded
+        # simulations resume with the same generators
+        inputs = result_key(params, initial_state, T, R, options)
+        if resume:
+            seed = np.random.SeedSequence(checkpoints.resume(inputs))
+        else:
+            seed = np.random.SeedSequence(options.seed)
+            checkpoints.start(inputs, seed.entropy, options.metrics)
+        options = replace(options, seed=seed)
+
+    writer = None
+    if store is not None:
+        writer = store.writer(scenario, result_variables(initial_state, options.metrics))
+
+    try:
+        if options.engine == 'batched':
+            stats = execute_batched(params, initial_state, T, R, options, writer, profiler, checkpoints=checkpoints, resume=resume, progress=progress)
+        else:
+            stats = execute_radcad(params, initial_state, state_update_blocks, T, R, options, writer, profiler, checkpoints=checkpoints, resume=resume, progress=progress)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        # emit stops tracing too, but it is never reached when a run fails
+        if profiler is not None:
+            stop_tracing()
+    df = stats.frame()
+
+    if store is not None:
+        writer.close()
+        store.write_aggregates(scenario, df)
+    if key is not None:
+        cache.put(key, df)
+    if profiler is not None:
+        profiler.emit()
+
+    return df
+
+
+def execute_adaptive(params, initial_state, state_update_blocks, T, options=None, tolerance=0.05, variables=CONVERGENCE_VARIABLES, confidence=0.95, min_runs=10, max_runs=500, max_seconds=None, cache=None, progress=None):
+    """
+    like execute, but adds runs in batches until the confidence interval of
+    the mean of every variable, at every timestep, is narrower than
+    tolerance (a fraction, or a dict of them by variable) times the mean, or
+    max_runs or max_seconds is reached. the frame's attrs hold the runs used
+    and whether the bands converged. radCAD runs are those of execute with
+    the same seed, so converging after n runs simulates execute(..., R=n)
+    """
+    options = options or RunOptions()
+    lookback_weeks(params)
+    if min_runs < 2:
+        raise ValueError(f"min_runs must be at least 2, not {min_runs}")
+    if max_runs < min_runs:
+        raise ValueError(f"max_runs ({max_runs}) must be at least min_runs ({min_runs})")
+
+    key = None
+    if cache is not None and options.seed is not None and max_seconds is None:
+        settings = ('adaptive', tolerance, list(variables), confidence, min_runs, max_runs)
+        key = result_key(params, initial_state, T, settings, options)
+        df = cache.get(key)
+        if df is not None:
+            logging.info(f"simulation loaded from cache {key[:12]}")
+            return df
+
+    tolerances = np.array([tolerance[variable] if isinstance(tolerance, dict) else tolerance for variable in variables])
+    root = np.random.SeedSequence(options.seed)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
     start_time = time.time()
-    result = experiment.run()
-    end_time = time.time()
-    logging.info(f"simulation completed in {end_time - start_time:.2f} seconds")
 
-    df = pd.DataFrame(result)
-    
-    df = post_process(df)
-    
+    stats = None
+    runs, batch = 0, min_runs
+    while True:
+        if options.engine == 'batched':
+            batch_stats = execute_batched(params, initial_state, T, batch, replace(options, seed=run_seed(root, runs)), first_run=runs, progress=progress, total=max_runs)
+        else:
+            batch_stats = execute_radcad(params, initial_state, state_update_blocks, T, batch, replace(options, seed=root), first_run=runs, progress=progress, total=max_runs)
+
+        if stats is None:
+            stats = batch_stats
+        else:
+            stats.merge(batch_stats)
+        runs += batch
+
+        # runs needed for the interval half-width z * std / sqrt(n) to reach
+        # tolerance * |mean|, worst case over the variables and timesteps
+        columns = [stats.variables.index(variable) for variable in variables]
+        std = stats.std[:, columns]
+        target = tolerances * np.abs(stats.mean[:, columns])
+        # a nan std (runs that overflowed) never counts as converged
+        with np.errstate(divide='ignore', invalid='ignore'):
+            needed = np.where(std == 0, 0, (z * std / target) ** 2)
+        needed = np.nan_to_num(needed, nan=np.inf).max()
+
+        converged = needed <= runs
+        out_of_time = max_seconds is not None and time.time() - start_time >= max_seconds
+        if converged or out_of_time or runs >= max_runs:
+            break
+        batch = int(min(max(np.ceil(needed) - runs, min_runs), max_runs - runs))
+
+    logging.info(f"adaptive simulation used {runs} runs ({'converged' if converged else 'not converged'}) in {time.time() - start_time:.2f} seconds")
+
+    df = stats.frame()
+    df.attrs['runs'] = runs
+    df.attrs['converged'] = bool(converged)
+    if key is not None:
+        cache.put(key, df)
 
     return df
 
 
-def post_process(df):
-    # extract numeric information from provider column and drop it
-    # extract number of providers, average capacity, average reward rate, average service price
+def run_seed(root, run):
+    """
+    the SeedSequence of a run, equal to root.spawn(R)[run] for any R > run
+    """
+    return np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (run,))
+
+
+def run_generators(root, run, crn=False, antithetic=False):
+    """
+    the generator of a run and its streams, one generator per source of
+    randomness (utils.STREAMS) with crn and none otherwise.
+
+    with antithetic, runs come in pairs seeded alike and the second run of a
+    pair draws the mirror image of the first run's numbers (see
+    utils.Antithetic), so the pair's noise partly cancels in the mean
+    """
+    seed = run_seed(root, run // 2 if antithetic else run)
+    rng = np.random.default_rng(seed)
+    streams = {}
+    if crn:
+        streams = {name: np.random.default_rng(child) for name, child in zip(STREAMS, seed.spawn(len(STREAMS)))}
+
+    if antithetic and run % 2 == 1:
+        rng = Antithetic(rng)
+        streams = {name: Antithetic(generator) for name, generator in streams.items()}
+    return rng, streams
+
+
+def execute_batched(params, initial_state, T, R, options, writer=None, profiler=None, first_run=0, checkpoints=None, resume=False, progress=None, total=None):
+    start_time = time.time()
+    stats = run_batched(params, initial_state, T, R, options, writer, profiler, first_run, checkpoints, resume)
+    if progress is not None:
+        progress(first_run + R, total or first_run + R)
+    end_time = time.time()
+    logging.info(f"batched simulation completed in {end_time - start_time:.2f} seconds")
+
+    return stats
+
+
+def state_values(state, variables, metrics=METRICS):
+    """
+    numeric values of variables in state, with heavy variables replaced by
+    their extracted metrics
+    """
+    values = {**state, **extract(state, metrics)}
+    return [values[variable] for variable in variables]
 
-    df['num_providers'] = df['providers'].apply(lambda x: len(x))
-    df['avg_capacity'] = df['providers'].apply(lambda x: sum([p.capacity for p in x]) / len(x))
-    
 
-    df = df.drop(columns=['providers'])
-    
-    df = df.groupby(['timestep']).agg(['mean', 'std']).reset_index()
-    
-    
-    return df
\ No newline at end of file
+@dataclass
+class StreamingExecution(SimulationExecution):
+    """
+    radCAD execution that turns each end-of-week state into a row of numbers
+    (running the metric extractors on the heavy variables) and keeps only the
+    latest state instead of the whole result history.
+
+    a run resumed from a snapshot starts at the snapshot's timestep, with
+    values holding the rows recorded up to it. schedule maps a week to the
+    params that change from that week on
+    """
+    variables: list = None
+    metrics: dict = None
+    values: np.ndarray = None
+    checkpoints: Checkpoints = None
+    schedule: dict = None
+
+    def before_execution(self) -> None:
+        super().before_execution()
+        recorded = self.values
+        self.values = np.empty((self.timestep + self.timesteps + 1, len(self.variables)))
+        if recorded is None:
+            self.values[self.timestep] = state_values(self.result[0][0], self.variables, self.metrics)
+        else:
+            self.values[:len(recorded)] = recorded
+
+    def before_step(self) -> None:
+        super().before_step()
+        # self.timestep is the week being left, the step computes the next
+        if self.schedule and self.timestep + 1 in self.schedule:
+            self.params = {**self.params, **self.schedule[self.timestep + 1]}
+
+    def after_step(self) -> None:
+        super().after_step()
+        state = self.result[-1][-1]
+        timestep = state['timestep']
+        self.values[timestep] = state_values(state, self.variables, self.metrics)
+
+        # the next step only needs the latest state
+        self.result = [self.result[-1]]
+
+        if self.checkpoints is not None and self.checkpoints.due(timestep, len(self.values) - 1):
+            self.checkpoints.save(f"run-{self.run_index}", {
+                'timestep': timestep,
+                'state': state,
+                'rng': self.params['rng'].bit_generator.state,
+                'streams': {name: generator.bit_generator.state for name, generator in self.params.get('streams', {}).items()},
+                'values': self.values[:timestep + 1]
+            })
+
+
+def run_execution(execution):
+    execution.execute()
+    return execution.values
+
+
+def map_executions(function, executions, processes):
+    """
+    yields function(execution) in order, on a pool unless processes is 1
+    """
+    if processes == 1:
+        yield from map(function, executions)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            yield from pool.imap(function, executions)
+
+
+def run_profiled_execution(execution):
+    start_time = time.perf_counter()
+    execution.execute()
+    seconds = time.perf_counter() - start_time
+    return execution.values, collect(execution.state_update_blocks), seconds
+
+
+def execute_radcad(params, initial_state, state_update_blocks, T, R, options, writer=None, profiler=None, first_run=0, checkpoints=None, resume=False, progress=None, total=None):
+    variables = result_variables(initial_state, options.metrics)
+    if profiler is not None:
+        state_update_blocks = instrument(state_update_blocks, profiler.memory)
+    seed = options.seed
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    def execution(run):
+        rng, streams = run_generators(root, run, options.crn, options.antithetic)
+        state, timestep, values = initial_state, 0, None
+
+        snapshot = checkpoints.load(f"run-{run + 1}") if resume else None
+        if snapshot is not None:
+            rng.bit_generator.state = snapshot['rng']
+            for name, generator in streams.items():
+                generator.bit_generator.state = snapshot['streams'][name]
+            state, timestep, values = snapshot['state'], snapshot['timestep'], snapshot['values']
+
+        return StreamingExecution(
+            timesteps=T - timestep,
+            initial_state=dict(state),
+            state_update_blocks=state_update_blocks,
+            params={**params, 'rng': rng, 'streams': streams},
+            enable_deepcopy=options.deepcopy,
+            drop_substeps=True,
+            run_index=run + 1,
+            variables=variables,
+            metrics=options.metrics,
+            values=values,
+            checkpoints=checkpoints
+        )
+
+    executions = (execution(run) for run in range(first_run, first_run + R))
+
+    start_time = time.time()
+    stats = RunningStats(variables, T)
+    processes = options.processes or multiprocessing.cpu_count() - 1 or 1
+
+    def add_run(values):
+        stats.add_runs(values[None])
+        if writer is not None:
+            writer.add_runs(values[None])
+
+    def add_profiled_run(result):
+        values, counters, seconds = result
+        profiler.add(counters, seconds)
+        add_run(values)
+
+    run, add = (run_execution, add_run) if profiler is None else (run_profiled_execution, add_profiled_run)
+
+    # runs are folded into the statistics as they finish, in run order so
+    # serial and parallel execution round identically
+    # an exception from progress leaves the pool, which terminates the workers
+    for done, result in enumerate(map_executions(run, executions, processes), start=first_run + 1):
+        add(result)
+        if progress is not None:
+            progress(done, total or first_run + R)
+
+    end_time = time.time()
+    logging.info(f"simulation completed in {end_time - start_time:.2f} seconds")
+
+    return stats
@@ -0,0 +1,131 @@
+"""
+scenario files for headless runs (see __main__.py).
+
+a scenario file is TOML (.toml) or YAML (.yaml/.yml, needs PyYAML). its top
+level keys are defaults for every scenario, and each [[scenario]] table (a
+list under `scenario` in YAML) is one scenario. a file without scenario
+tables is a single scenario.
+
+    T = 104
+    R = 200
+    seed = 0
+    engine = "batched"
+
+    [[scenario]]
+    name = "bme"
+    demand_type = "growth"
+    macro_condition = "sideways"
+    max_mint = 3500
+    percent_burned = 1.0
+    initial_supply = 1_000_000
+
+    [scenario.params]
+    provider_inflow_rate = 20
+
+    [scenario.initial_state]
+    token_price = 2
+
+the form keys (demand_type, macro_condition, max_mint, percent_burned,
+initial_supply) build params and the initial state as in the app, `params`
+and `initial_state` tables override single entries of them.
+"""
+import os
+import tomllib
+
+from .options import ENGINES, RunOptions
+from .sweep import CONFIG_KEYS, run_config, validate_config
+from .utils import is_int
+
+DEFAULTS = {
+    'demand_type': 'consistent',
+    'macro_condition': 'sideways',
+    'max_mint': 3500,
+    'percent_burned': 0.5,
+    'initial_supply': 1_000_000,
+    'provider_model': 'agents',
+    'T': 52,
+    'R': 100,
+    'seed': None,
+    'engine': 'radcad',
+    'params': {},
+    'initial_state': {}
+}
+
+
+def read_file(path) -> dict:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.toml':
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    elif extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("reading YAML scenario files needs PyYAML (pip install pyyaml)") from None
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    else:
+        raise ValueError(f"Invalid scenario file type: {path}")
+
+
+def validate_scenario(scenario):
+    """
+    raises ValueError for a scenario that would fail to run. names become
+    file names, so they may not contain path separators
+    """
+    name = scenario['name']
+    separators = [separator for separator in ('/', '\\', os.sep, os.altsep) if separator]
+    if not isinstance(name, str) or name in ('', '.', '..') or any(separator in name for separator in separators):
+        raise ValueError(f"Invalid name: {name!r}")
+    validate_config(scenario)
+    if not is_int(scenario['T']) or scenario['T'] < 1:
+        raise ValueError("T must be a positive integer")
+    if not is_int(scenario['R']) or scenario['R'] < 1:
+        raise ValueError("R must be a positive integer")
+    if scenario['seed'] is not None and (not is_int(scenario['seed']) or scenario['seed'] < 0):
+        raise ValueError("seed must be a non-negative integer")
+    if scenario['engine'] not in ENGINES:
+        raise ValueError(f"Invalid engine: {scenario['engine']!r}")
+
+
+def load_scenarios(path) -> list:
+    """
+    the scenarios of a file, each a complete dict of DEFAULTS keys plus its
+    name (the file name, numbered when the file holds several)
+    """
+    content = read_file(path)
+    defaults = {key: value for key, value in content.items() if key != 'scenario'}
+    tables = content.get('scenario', [{}])
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    scenarios = []
+    for index, table in enumerate(tables):
+        scenario = {**DEFAULTS, **defaults, **table}
+        unknown = set(scenario) - set(DEFAULTS) - {'name'}
+        if unknown:
+            raise ValueError(f"Invalid scenario keys in {path}: {sorted(unknown)}")
+        for key in ('params', 'initial_state'):
+            if not all(isinstance(source.get(key, {}), dict) for source in (defaults, table)):
+                raise ValueError(f"Invalid scenario in {path}: {key} must be a table")
+            scenario[key] = {**defaults.get(key, {}), **table.get(key, {})}
+        scenario.setdefault('name', stem if len(tables) == 1 else f"{stem}-{index + 1}")
+        try:
+            validate_scenario(scenario)
+        except ValueError as error:
+            raise ValueError(f"Invalid scenario {scenario['name']!r} in {path}: {error}") from None
+        scenarios.append(scenario)
+    return scenarios
+
+
+def run_scenario(scenario, processes=1, cache=None, store=None):
+    """
+    simulates one scenario and returns its frame, a ResultStore partitions
+    its runs by the scenario's name
+    """
+    config = {key: scenario[key] for key in CONFIG_KEYS + ['provider_model']}
+    options = RunOptions(engine=scenario['engine'], seed=scenario['seed'], processes=processes)
+
+    return run_config(
+        config, scenario['T'], scenario['R'], options, cache, store, {'scenario': scenario['name']},
+        scenario['params'], scenario['initial_state']
+    )
@@ -0,0 +1,175 @@
+"""
+global sensitivity analysis of the model parameters.
+
+a problem maps params keys (or initial state keys, such as
+circulating_supply) to (low, high) ranges, e.g.
+
+    problem = {'tp_flows_sensitivity': (0.5, 1.5), 'cost_floor': (0.05, 0.2)}
+    indices = sobol(params('growth', 'bullish', 3500, 0.5), initial_state(1_000_000, 'growth'), problem, T=52, n=512)
+
+morris() screens many parameters cheaply with elementary effects, sobol()
+estimates first-order and total-order variance shares with a Saltelli
+design. both report indices for every output metric at every timestep, as a
+long frame with one row per (output, timestep, parameter).
+
+every design point is simulated with the batched engine for R runs and the
+model output is the mean of those runs. all points use the same seed and
+common random numbers (RunOptions(crn=True)), so they share their
+macro, demand and service draws even when they onboard different numbers of
+providers, and differences between points come from the parameters rather
+than the noise. points are evaluated in chunks on a process pool, so
+thousands of them fit in a night on one machine.
+
+ranges whose bounds are both ints (max_mint, provider_lookback_weeks) are
+sampled as ints.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .batched import run_batched
+from .metrics import METRICS
+from .options import RunOptions
+from .provider import lookback_weeks
+from .utils import scale
+
+OUTPUTS = ['token_price', 'circulating_supply', 'num_providers']
+
+
+def morris_design(problem, trajectories, levels=4, rng=np.random):
+    """
+    unit cube trajectories of k + 1 points on a grid of levels values, each
+    step moving one parameter by delta = levels / (2 (levels - 1)). returns
+    the (trajectories * (k + 1), k) points and the signed step of each move
+    """
+    k = len(problem)
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels) / (levels - 1)
+
+    points = np.empty((trajectories, k + 1, k))
+    steps = np.empty((trajectories, k))
+    for trajectory in range(trajectories):
+        x = rng.choice(grid, size=k)
+        # move up unless that leaves the cube
+        step = np.where(x + delta <= 1, delta, -delta)
+        points[trajectory, 0] = x
+        for position, parameter in enumerate(rng.permutation(k)):
+            x = x.copy()
+            x[parameter] += step[parameter]
+            points[trajectory, position + 1] = x
+        steps[trajectory] = step
+
+    return points.reshape(-1, k), steps
+
+
+def saltelli_design(problem, n, rng=np.random):
+    """
+    unit cube points A, B and the k matrices AB_i (A with column i taken
+    from B), stacked as (n * (k + 2), k)
+    """
+    k = len(problem)
+    a = rng.random((n, k))
+    b = rng.random((n, k))
+    ab = np.repeat(a[None], k, axis=0)
+    for i in range(k):
+        ab[i, :, i] = b[:, i]
+
+    return np.concatenate([a, b, ab.reshape(-1, k)])
+
+
+def _evaluate_chunk(params, initial_state, points, T, R, outputs, seed, metrics):
+    values = []
+    for point in points:
+        params_point = {**params, **{key: value for key, value in point.items() if key not in initial_state}}
+        initial_state_point = {**initial_state, **{key: value for key, value in point.items() if key in initial_state}}
+
+        stats = run_batched(params_point, initial_state_point, T, R, RunOptions(engine='batched', seed=seed, crn=True, metrics=metrics))
+        values.append(stats.mean[:, [stats.variables.index(output) for output in outputs]])
+    return np.array(values)
+
+
+def evaluate(params, initial_state, points, T, R=100, outputs=OUTPUTS, seed=None, processes=None, chunksize=None, metrics=METRICS):
+    """
+    per-timestep mean of every output at every point (a list of overrides),
+    as a (points, T + 1, outputs) array
+    """
+    for point in points:
+        lookback_weeks({**params, **point})
+    # one entropy for every point, also when unseeded
+    seed = np.random.SeedSequence(seed).entropy
+    processes = processes or os.cpu_count()
+    chunksize = chunksize or max(len(points) // (processes * 4), 1)
+    chunks = [points[start:start + chunksize] for start in range(0, len(points), chunksize)]
+
+    if processes == 1:
+        return np.concatenate([_evaluate_chunk(params, initial_state, chunk, T, R, outputs, seed, metrics) for chunk in chunks])
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(_evaluate_chunk, params, initial_state, chunk, T, R, outputs, seed, metrics) for chunk in chunks]
+        return np.concatenate([future.result() for future in futures])
+
+
+def indices_frame(problem, outputs, **indices):
+    """
+    long frame of (parameters, timesteps, outputs) index arrays
+    """
+    k, timesteps, _ = next(iter(indices.values())).shape
+    index = pd.MultiIndex.from_product([outputs, range(timesteps), list(problem)], names=['output', 'timestep', 'parameter'])
+    # reorder to output, timestep, parameter
+    columns = {name: values.transpose(2, 1, 0).ravel() for name, values in indices.items()}
+    return pd.DataFrame(columns, index=index).reset_index()
+
+
+def morris(params, initial_state, problem, T, R=100, trajectories=20, levels=4, outputs=OUTPUTS, seed=None, processes=None, metrics=METRICS):
+    """
+    elementary effects screening with (k + 1) * trajectories points. mu_star
+    is the mean absolute change of an output per unit of a parameter's range,
+    sigma the spread of the changes (non-linearity or interactions)
+    """
+    rng = np.random.default_rng(seed)
+    unit, steps = morris_design(problem, trajectories, levels, rng)
+    y = evaluate(params, initial_state, scale(problem, unit), T, R, outputs, seed, processes, metrics=metrics)
+
+    k = len(problem)
+    y = y.reshape(trajectories, k + 1, *y.shape[1:])
+    unit = unit.reshape(trajectories, k + 1, k)
+
+    # the parameter each move changed, and the output change it caused
+    moved = np.argmax(unit[:, 1:] != unit[:, :-1], axis=2)
+    effects = np.empty((trajectories, k, *y.shape[2:]))
+    for trajectory in range(trajectories):
+        for position, parameter in enumerate(moved[trajectory]):
+            effects[trajectory, parameter] = (y[trajectory, position + 1] - y[trajectory, position]) / steps[trajectory, parameter]
+
+    return indices_frame(
+        problem, outputs,
+        mu=effects.mean(axis=0),
+        mu_star=np.abs(effects).mean(axis=0),
+        sigma=effects.std(axis=0, ddof=1)
+    )
+
+
+def sobol(params, initial_state, problem, T, R=100, n=256, outputs=OUTPUTS, seed=None, processes=None, metrics=METRICS):
+    """
+    first-order (S1) and total-order (ST) sobol indices from n * (k + 2)
+    points, with the Saltelli (2010) and Jansen estimators. S1 is the share of
+    an output's variance explained by a parameter alone, ST includes its
+    interactions. indices are nan where the output does not vary, as at t=0
+    """
+    rng = np.random.default_rng(seed)
+    unit = saltelli_design(problem, n, rng)
+    y = evaluate(params, initial_state, scale(problem, unit), T, R, outputs, seed, processes, metrics=metrics)
+
+    # centred, the first-order estimator is noisy for outputs far from zero
+    k = len(problem)
+    y = y - y[:2 * n].mean(axis=0)
+    y_a, y_b, y_ab = y[:n], y[n:2 * n], y[2 * n:].reshape(k, n, *y.shape[1:])
+    variance = np.concatenate([y_a, y_b]).var(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        first = (y_b * (y_ab - y_a)).mean(axis=1) / variance
+        total = 0.5 * ((y_a - y_ab) ** 2).mean(axis=1) / variance
+
+    return indices_frame(problem, outputs, S1=first, ST=total)
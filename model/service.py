@@ -0,0 +1,326 @@
+"""
+local simulation job service.
+
+a small HTTP/JSON server that runs the app's adaptive simulations for any
+number of clients on one bounded pool of worker processes (see jobs.py):
+
+    python -m model.service --port 8765 --workers 4
+
+    POST   /jobs              {"config": {...}, "T": 52, "seed": 0, "settings": {...}}
+    GET    /jobs/<id>         state, runs done and expected, error
+    GET    /jobs/<id>/result  the aggregated frame
+    DELETE /jobs/<id>         cancel
+    GET    /health
+
+config holds the form keys of sweep.grid and settings the keyword arguments
+of jobs.simulate listed in SETTINGS. a job's id is the hash of its
+specification and the model code, so identical jobs submitted by several
+clients are simulated once: a second submission joins the job in progress or
+is answered from the store. finished frames are kept in a result store that
+never evicts, shared by every client and surviving restarts of the service,
+so a job reported done stays fetchable. the simulations themselves read and
+fill the (evicting) result cache. cancelling a job cancels it for every
+client waiting on it.
+
+ServiceClient is the matching client, used by the app.
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from .cache import ResultCache, code_version
+from .jobs import CANCELLED, DONE, FAILED, JobQueue, simulate
+from .options import ENGINES
+from .run import CONVERGENCE_VARIABLES, execute_adaptive
+from .sweep import CONFIG_KEYS, validate_config
+from .utils import is_int, is_number
+
+SETTINGS = ['tolerance', 'variables', 'confidence', 'min_runs', 'max_runs', 'engine']
+
+
+def job_key(spec) -> str:
+    return hashlib.sha256(json.dumps({**spec, 'code': code_version()}, sort_keys=True).encode()).hexdigest()
+
+
+def validate_settings(settings):
+    """
+    checks the values of the settings passed on to execute_adaptive, so a
+    bad one is answered with 400 rather than a failed job
+    """
+    defaults = inspect.signature(execute_adaptive).parameters
+    if 'engine' in settings and settings['engine'] not in ENGINES:
+        raise ValueError(f"Invalid engine: {settings['engine']!r}")
+
+    variables = settings.get('variables', CONVERGENCE_VARIABLES)
+    if not isinstance(variables, list) or not variables or not all(isinstance(variable, str) for variable in variables):
+        raise ValueError("variables must be a non-empty list of strings")
+
+    tolerance = settings.get('tolerance', defaults['tolerance'].default)
+    tolerances = tolerance.values() if isinstance(tolerance, dict) else [tolerance]
+    if not all(is_number(value) and value > 0 for value in tolerances):
+        raise ValueError("tolerance must be a positive number or an object of them by variable")
+    if isinstance(tolerance, dict) and set(variables) - set(tolerance):
+        raise ValueError(f"tolerance has no value for {sorted(set(variables) - set(tolerance))}")
+
+    confidence = settings.get('confidence', defaults['confidence'].default)
+    if not is_number(confidence) or not 0 < confidence < 1:
+        raise ValueError("confidence must be a number between 0 and 1")
+
+    min_runs = settings.get('min_runs', defaults['min_runs'].default)
+    max_runs = settings.get('max_runs', defaults['max_runs'].default)
+    if not is_int(min_runs) or min_runs < 2:
+        raise ValueError("min_runs must be an integer of at least 2")
+    if not is_int(max_runs) or max_runs < min_runs:
+        raise ValueError("max_runs must be an integer of at least min_runs")
+
+
+def validate(spec) -> dict:
+    """
+    the normalised job specification, raises ValueError for invalid ones
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("a job must be a JSON object")
+    config = spec.get('config')
+    if not isinstance(config, dict) or sorted(config) != sorted(CONFIG_KEYS):
+        raise ValueError(f"config must have exactly the keys {CONFIG_KEYS}")
+    validate_config(config)
+
+    T = spec.get('T', 52)
+    if not is_int(T) or T < 1:
+        raise ValueError("T must be a positive integer")
+    seed = spec.get('seed', 0)
+    if seed is not None and (not is_int(seed) or seed < 0):
+        raise ValueError("seed must be a non-negative integer or null")
+    settings = spec.get('settings', {})
+    if not isinstance(settings, dict):
+        raise ValueError("settings must be an object")
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"Invalid settings: {sorted(unknown)}")
+    validate_settings(settings)
+
+    return {'config': config, 'T': T, 'seed': seed, 'settings': settings}
+
+
+def frame_to_json(df) -> dict:
+    values = df.to_numpy(dtype=float)
+    return {
+        'attrs': df.attrs,
+        'columns': [list(column) for column in df.columns],
+        'data': np.where(np.isnan(values), None, values).tolist()
+    }
+
+
+def frame_from_json(content) -> pd.DataFrame:
+    df = pd.DataFrame(content['data'], columns=pd.MultiIndex.from_tuples([tuple(column) for column in content['columns']]), dtype=float)
+    df.attrs.update(content['attrs'])
+    return df
+
+
+class JobService:
+    """
+    deduplicating front of a JobQueue. simulations use cache, finished jobs
+    are kept in results, a ResultCache that should never evict
+    """
+    def __init__(self, workers=None, cache=None, results=None):
+        self.queue = JobQueue(workers)
+        self.cache = cache or ResultCache()
+        self.results = results or ResultCache('.cache/jobs', max_bytes=None)
+        # runs of a job, so jobs running side by side share the cores
+        self.processes = max(os.cpu_count() // self.queue.workers, 1)
+        # job key -> queue job id of the jobs not yet collected
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, spec) -> dict:
+        spec = validate(spec)
+        key = job_key(spec)
+        with self.lock:
+            # failed and cancelled jobs are run again
+            if key in self.jobs and self._collect(key)['state'] in (FAILED, CANCELLED):
+                self.queue.discard(self.jobs.pop(key))
+            if key not in self.jobs and key not in self.results:
+                self.jobs[key] = self.queue.submit(
+                    simulate, spec['config'], spec['T'],
+                    seed=spec['seed'], cache=self.cache, processes=self.processes, **spec['settings']
+                )
+                logging.info(f"job {key[:12]} queued: {spec}")
+        return {'id': key, **self.status(key)}
+
+    def _collect(self, key):
+        """
+        moves a finished job's frame to the store, returns its queue status
+        """
+        status = self.queue.status(self.jobs[key])
+        if status['state'] == DONE:
+            self.results.put(key, self.queue.result(self.jobs[key]))
+            self.queue.discard(self.jobs.pop(key))
+        return status
+
+    def status(self, key) -> dict:
+        """
+        state, runs done and expected so far and error of a job. failed and
+        cancelled jobs keep their state until they are submitted again
+        """
+        with self.lock:
+            if key in self.jobs:
+                return self._collect(key)
+        if key in self.results:
+            return {'state': DONE, 'done': None, 'total': None, 'error': None}
+        raise KeyError(key)
+
+    def result(self, key) -> pd.DataFrame:
+        state = self.status(key)['state']
+        if state != DONE:
+            raise LookupError(f"job {key[:12]} is {state}")
+        df = self.results.get(key)
+        if df is None:
+            # removed from the store since
+            raise KeyError(key)
+        return df
+
+    def cancel(self, key):
+        with self.lock:
+            if key not in self.jobs:
+                raise KeyError(key)
+            self.queue.cancel(self.jobs[key])
+
+    def shutdown(self):
+        self.queue.shutdown()
+
+
+class Handler(BaseHTTPRequestHandler):
+    service: JobService = None
+
+    def reply(self, code, content):
+        body = json.dumps(content).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, method):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        try:
+            if method == 'GET' and parts == ['health']:
+                return self.reply(200, {'workers': self.service.queue.workers})
+            if method == 'POST' and parts == ['jobs']:
+                length = int(self.headers.get('Content-Length', 0))
+                status = self.service.submit(json.loads(self.rfile.read(length) or b'{}'))
+                return self.reply(200 if status['state'] == DONE else 202, status)
+            if len(parts) == 2 and parts[0] == 'jobs':
+                if method == 'GET':
+                    return self.reply(200, {'id': parts[1], **self.service.status(parts[1])})
+                if method == 'DELETE':
+                    self.service.cancel(parts[1])
+                    return self.reply(202, {'id': parts[1]})
+            if method == 'GET' and len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+                return self.reply(200, frame_to_json(self.service.result(parts[1])))
+            self.reply(404, {'error': f"no route for {method} {self.path}"})
+        except KeyError:
+            self.reply(404, {'error': 'unknown job'})
+        except LookupError as error:
+            self.reply(409, {'error': str(error)})
+        except ValueError as error:
+            self.reply(400, {'error': str(error)})
+        except Exception as error:
+            logging.exception(f"{method} {self.path} failed")
+            self.reply(500, {'error': repr(error)})
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_DELETE(self):
+        self.route('DELETE')
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def start_server(host='127.0.0.1', port=8765, workers=None, cache=None, results=None):
+    """
+    starts the service on a background thread and returns the server, whose
+    url attribute is the base url (port=0 picks a free port)
+    """
+    service = JobService(workers, cache, results)
+    handler = type('ServiceHandler', (Handler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.service = service
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ServiceClient:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def _request(self, method, path, content=None):
+        data = None if content is None else json.dumps(content).encode()
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            message = json.loads(error.read()).get('error', error.reason)
+            if error.code == 404:
+                raise KeyError(message) from None
+            if error.code == 409:
+                raise LookupError(message) from None
+            if error.code == 400:
+                raise ValueError(message) from None
+            raise RuntimeError(message) from None
+
+    def submit(self, config, T=52, seed=0, **settings) -> str:
+        """
+        queues a simulation of config and returns the job id
+        """
+        return self._request('POST', '/jobs', {'config': config, 'T': T, 'seed': seed, 'settings': settings})['id']
+
+    def status(self, job_id) -> dict:
+        return self._request('GET', f"/jobs/{job_id}")
+
+    def result(self, job_id) -> pd.DataFrame:
+        return frame_from_json(self._request('GET', f"/jobs/{job_id}/result"))
+
+    def cancel(self, job_id):
+        self._request('DELETE', f"/jobs/{job_id}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m model.service', description='local simulation job service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, help='simulations run at once, default half the cores')
+    parser.add_argument('--cache', default='.cache/results', help='directory of the result cache used by the simulations')
+    parser.add_argument('--results', default='.cache/jobs', help='directory of the finished jobs, never evicted')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    server = start_server(args.host, args.port, args.workers, ResultCache(args.cache), ResultCache(args.results, max_bytes=None))
+    logging.info(f"serving simulations on {server.url} with {server.service.queue.workers} workers")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,7 +16,9 @@ state_update_blocks = [
             'providers': update_providers,
             'total_capacity': update_total_capacity,
             'demand': update_demand,
-            'net_flow': update_leaving_provider_selling
+            'net_flow': update_leaving_provider_selling,
+            'providers_joined': update_providers_joined,
+            'providers_left': update_providers_left
         }
     },
     {
@@ -25,6 +27,7 @@ state_update_blocks = [
             'protocol_service': protocol_service
         },
         'variables': {
+            'providers': update_provider_rewards,
             'circulating_supply': update_circulating_supply,
             'reward_rate': update_reward_rate,
             'service_price': update_service_price,
@@ -1,5 +1,7 @@
+from model.provider import ProviderPool
+
 initial_state = {
-    'providers': [],
+    'providers': ProviderPool(),
     'service_price': 1,
     'demand': 1,
     'token_price': 1,
@@ -7,5 +9,7 @@ initial_state = {
     'circulating_supply': 1,
     'macro': 1,
     'total_capacity': 1,
-    'net_flow': 0
+    'net_flow': 0,
+    'providers_joined': 0,
+    'providers_left': 0
 }
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+columnar result store.
+
+every simulated scenario is written as two parquet files under a hive style
+directory tree partitioned by the scenario parameters, e.g.
+
+    results/runs/demand_type=growth/macro_condition=bearish/max_mint=3500/.../data.parquet
+    results/aggregates/demand_type=growth/macro_condition=bearish/max_mint=3500/.../data.parquet
+
+runs holds the raw per-run trajectories, one row per (run, timestep) and one
+column per recorded variable, and is written in row groups while the
+simulation runs, so the runs never have to fit in memory. aggregates holds the
+per-timestep mean and std frame returned by execute.
+
+the reader opens the whole tree as a pyarrow dataset over memory-mapped files
+and only reads the columns, row groups and partitions a query asks for, so
+sweeps bigger than RAM can be sliced without re-running them.
+
+every scenario in a store must use the same keys in the same order, as the
+partition layout is read from the first file.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
+import pyarrow.parquet as pq
+
+from .utils import AtomicPath
+
+KINDS = ['runs', 'aggregates']
+
+
+class TrajectoryWriter:
+    """
+    streams per-run values to a parquet file. add_runs and add_timestep take
+    the same arrays as RunningStats, rows are buffered until row_group_size
+    and the file only appears under its final name once closed
+    """
+    def __init__(self, path, variables, row_group_size=65536):
+        self.path = path
+        self.variables = list(variables)
+        self.row_group_size = row_group_size
+        self.schema = pa.schema([('timestep', pa.int64())] + [(variable, pa.float64()) for variable in self.variables])
+
+        self.target = AtomicPath(path)
+        self.writer = pq.ParquetWriter(self.target.tmp_path, self.schema)
+        self.buffer = []
+        self.buffered = 0
+
+    def _append(self, timestep, values):
+        self.buffer.append((timestep, values))
+        self.buffered += len(timestep)
+        if self.buffered >= self.row_group_size:
+            self.flush()
+
+    def add_runs(self, values, start=0):
+        """
+        values has shape (runs, timesteps, variables), for timesteps from start
+        """
+        values = np.asarray(values, dtype=float)
+        runs, timesteps, _ = values.shape
+        self._append(np.tile(np.arange(start, start + timesteps), runs), values.reshape(-1, len(self.variables)))
+
+    def add_timestep(self, t, values):
+        """
+        values has shape (runs, variables)
+        """
+        values = np.asarray(values, dtype=float)
+        self._append(np.full(len(values), t), values)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        timestep = np.concatenate([timestep for timestep, _ in self.buffer])
+        values = np.concatenate([values for _, values in self.buffer])
+        columns = [pa.array(timestep)] + [pa.array(values[:, i]) for i in range(len(self.variables))]
+        self.writer.write_table(pa.Table.from_arrays(columns, schema=self.schema))
+        self.buffer = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        self.target.commit()
+
+    def abort(self):
+        self.writer.close()
+        self.target.discard()
+
+
+class ResultStore:
+    def __init__(self, directory='results'):
+        self.directory = directory
+
+    def path(self, kind, scenario):
+        """
+        file holding one scenario's results, a scenario is stored once and
+        rewriting it replaces the old file
+        """
+        if not scenario:
+            raise ValueError("scenario must name at least one parameter")
+        partition = [f"{key}={value}" for key, value in scenario.items()]
+        return os.path.join(self.directory, kind, *partition, 'data.parquet')
+
+    def writer(self, scenario, variables):
+        return TrajectoryWriter(self.path('runs', scenario), variables)
+
+    def write_aggregates(self, scenario, df):
+        """
+        stores an execute frame, (var, stat) columns are flattened to 'var.stat'
+        """
+        flat = df.copy()
+        flat.columns = [f"{variable}.{stat}" if stat else variable for variable, stat in df.columns]
+
+        with AtomicPath(self.path('aggregates', scenario)) as tmp_path:
+            flat.to_parquet(tmp_path, index=False)
+
+    def dataset(self, kind='runs'):
+        """
+        the memory-mapped pyarrow dataset of every stored scenario. partition
+        values are read as strings, since the same key can hold ints and floats
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Invalid kind: {kind}")
+        root = os.path.join(self.directory, kind)
+
+        # finished files only, writers in progress hold a .tmp file
+        paths = sorted(str(path) for path in Path(root).rglob('data.parquet'))
+        if not paths:
+            raise FileNotFoundError(f"no {kind} stored in {self.directory}")
+
+        # the partition keys, in order, from the first file's path
+        keys = [part.split('=', 1)[0] for part in Path(paths[0]).relative_to(root).parts[:-1]]
+        partitioning = ds.partitioning(pa.schema([(key, pa.string()) for key in keys]), flavor='hive')
+
+        return ds.dataset(
+            paths,
+            format='parquet',
+            partitioning=partitioning,
+            partition_base_dir=root,
+            filesystem=fs.LocalFileSystem(use_mmap=True)
+        )
+
+    def _query(self, kind, variables, timesteps, scenario):
+        dataset = self.dataset(kind)
+        keys = dataset.partitioning.schema.names
+
+        if variables is None:
+            columns = None
+        elif kind == 'aggregates':
+            columns = keys + ['timestep'] + [f"{variable}.{stat}" for variable in variables for stat in ['mean', 'std']]
+        else:
+            columns = keys + ['timestep', 'run'] + [variable for variable in variables if variable != 'run']
+
+        condition = None
+        for key, value in scenario.items():
+            if isinstance(value, (list, tuple, set)):
+                term = ds.field(key).isin([str(v) for v in value])
+            else:
+                term = ds.field(key) == str(value)
+            condition = term if condition is None else condition & term
+
+        if timesteps is not None:
+            if isinstance(timesteps, slice):
+                term = ds.scalar(True)
+                if timesteps.start is not None:
+                    term = term & (ds.field('timestep') >= timesteps.start)
+                if timesteps.stop is not None:
+                    term = term & (ds.field('timestep') < timesteps.stop)
+            else:
+                term = ds.field('timestep').isin(list(timesteps))
+            condition = term if condition is None else condition & term
+
+        return dataset, columns, condition
+
+    def batches(self, kind='runs', variables=None, timesteps=None, **scenario):
+        """
+        iterates over the matching rows as pyarrow record batches, for results
+        too big to load at once
+        """
+        dataset, columns, condition = self._query(kind, variables, timesteps, scenario)
+        return dataset.to_batches(columns=columns, filter=condition)
+
+    def read(self, kind='runs', variables=None, timesteps=None, **scenario) -> pd.DataFrame:
+        """
+        loads the requested variables for timesteps (a slice or a list) of the
+        scenarios whose parameters match the keyword filters, a list value
+        matches any of its items. aggregates come back with the two-level
+        (var, stat) columns of execute
+        """
+        dataset, columns, condition = self._query(kind, variables, timesteps, scenario)
+        df = dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+        for key in dataset.partitioning.schema.names:
+            try:
+                df[key] = pd.to_numeric(df[key])
+            except ValueError:
+                pass
+
+        if kind == 'aggregates':
+            df.columns = pd.MultiIndex.from_tuples([tuple(column.split('.', 1)) if '.' in column else (column, '') for column in df.columns])
+        return df
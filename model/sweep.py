@@ -0,0 +1,179 @@
+"""
+parameter sweeps over tokenomics and scenarios.
+
+grid() expands lists of inputs into one configuration per combination, using
+the same keys the app collects from its form. sweep() runs the configurations
+on a process pool, one configuration per worker, and writes each
+configuration's aggregated frame to disk as soon as it finishes, together with
+a line in manifest.jsonl. configurations already in the manifest are skipped,
+so an interrupted sweep picks up where it stopped.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .options import RunOptions
+from .params import PROVIDER_MODELS, params, initial_state
+from .run import execute
+from .utils import is_number
+
+DEMAND_TYPES = ['consistent', 'high-to-decay', 'growth', 'volatile']
+MACRO_CONDITIONS = ['bearish', 'bullish', 'sideways']
+# the inputs of the app's form, which make up a config
+CONFIG_KEYS = ['demand_type', 'macro_condition', 'max_mint', 'percent_burned', 'initial_supply']
+
+
+def validate_config(config):
+    """
+    raises ValueError for config values params and initial_state would
+    reject or fail on
+    """
+    if config['demand_type'] not in DEMAND_TYPES:
+        raise ValueError(f"Invalid demand_type: {config['demand_type']!r}")
+    if config['macro_condition'] not in MACRO_CONDITIONS:
+        raise ValueError(f"Invalid macro_condition: {config['macro_condition']!r}")
+    for key in ('max_mint', 'percent_burned', 'initial_supply'):
+        if not is_number(config[key]):
+            raise ValueError(f"config {key} must be a number")
+    if config.get('provider_model', 'agents') not in PROVIDER_MODELS:
+        raise ValueError(f"Invalid provider_model: {config['provider_model']!r}")
+
+
+def grid(max_mint, percent_burned, initial_supply, demand_type=DEMAND_TYPES, macro_condition=MACRO_CONDITIONS):
+    """
+    returns the cartesian product of the given values as a list of configs
+    """
+    values = [demand_type, macro_condition, max_mint, percent_burned, initial_supply]
+
+    return [dict(zip(CONFIG_KEYS, combination)) for combination in itertools.product(*values)]
+
+
+def config_inputs(config, seed=None, params_overrides=None, initial_state_overrides=None):
+    """
+    params and initial state of a config, which may also set the
+    provider_model, with single entries replaced by the overrides
+    """
+    params_config = {
+        **params(config['demand_type'], config['macro_condition'], config['max_mint'], config['percent_burned']),
+        **(params_overrides or {})
+    }
+    initial_state_config = {
+        **initial_state(config['initial_supply'], config['demand_type'], seed, config.get('provider_model', 'agents')),
+        **(initial_state_overrides or {})
+    }
+    return params_config, initial_state_config
+
+
+def run_config(config, T, R, options=None, cache=None, store=None, scenario=None, params_overrides=None, initial_state_overrides=None):
+    """
+    runs a single config and returns the aggregated frame, in this process
+    unless options say otherwise. with a ResultStore the runs are also
+    written to it, partitioned by scenario (by default the config)
+    """
+    from .state_update_blocks import state_update_blocks
+
+    options = options or RunOptions(processes=1)
+    params_config, initial_state_config = config_inputs(config, options.seed, params_overrides, initial_state_overrides)
+    return execute(params_config, initial_state_config, state_update_blocks, T, R, options, cache=cache, store=store, scenario=scenario or config)
+
+
+def config_key(config, T, R, engine, seed, crn=False):
+    """
+    stable name for a config and run settings, used for its result file and
+    to skip configs that already finished
+    """
+    settings = {**config, 'T': T, 'R': R, 'engine': engine, 'seed': seed}
+    if crn:
+        settings['crn'] = True
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def write_frame(path, run, *args, **kwargs):
+    """
+    writes the frame returned by run(*args, **kwargs) to path as csv and
+    returns the file name and the seconds it took, for a manifest entry
+    """
+    start_time = time.time()
+    run(*args, **kwargs).to_csv(path, index=False)
+    return {'file': os.path.basename(path), 'seconds': time.time() - start_time}
+
+
+def _run_and_store(index, config, T, R, engine, seed, cache, store, crn, out_dir):
+    path = os.path.join(out_dir, f"{config_key(config, T, R, engine, seed, crn)}.csv")
+    options = RunOptions(engine=engine, seed=seed, processes=1, crn=crn)
+
+    return {
+        'index': index,
+        **config,
+        'T': T,
+        'R': R,
+        'engine': engine,
+        'seed': seed,
+        'crn': crn,
+        **write_frame(path, run_config, config, T, R, options, cache, store)
+    }
+
+
+def log_progress(progress):
+    logging.info(
+        f"sweep {progress['done']}/{progress['total']} done, "
+        f"{progress['elapsed']:.0f}s elapsed, eta {progress['eta']:.0f}s"
+    )
+
+
+def load_manifest(out_dir):
+    """
+    returns the manifest entries of the configs finished so far
+    """
+    path = os.path.join(out_dir, 'manifest.jsonl')
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sweep(configs, T, R, out_dir, processes=None, engine='radcad', seed=None, cache=None, store=None, crn=False, progress=log_progress):
+    """
+    runs every config across a process pool and streams the results to
+    out_dir. every config uses the same seed, with crn=True also on common
+    random numbers (see variance.py). with a ResultCache, configs already simulated
+    by the app or an earlier sweep are read from it. with a ResultStore, the
+    raw runs and aggregates of every config are written to it as partitioned
+    parquet (see store.py). progress is called after each config with the
+    number done, the total, the elapsed seconds and the estimated seconds left.
+    returns the manifest entries
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = load_manifest(out_dir)
+    finished = {os.path.splitext(entry['file'])[0] for entry in manifest}
+    pending = [(index, config) for index, config in enumerate(configs) if config_key(config, T, R, engine, seed, crn) not in finished]
+
+    total = len(pending)
+    start_time = time.time()
+
+    with open(os.path.join(out_dir, 'manifest.jsonl'), 'a') as f, \
+            ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        futures = [pool.submit(_run_and_store, index, config, T, R, engine, seed, cache, store, crn, out_dir) for index, config in pending]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            entry = future.result()
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            manifest.append(entry)
+
+            elapsed = time.time() - start_time
+            progress({
+                'done': done,
+                'total': total,
+                'elapsed': elapsed,
+                'eta': elapsed / done * (total - done),
+                'config': entry
+            })
+
+    return sorted(manifest, key=lambda entry: entry['index'])
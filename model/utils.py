@@ -0,0 +1,109 @@
+import os
+import tempfile
+
+import numpy as np
+
+# independent sources of randomness in the model. with common random numbers
+# each has its own generator, so a scenario that draws more (or fewer)
+# providers does not shift the macro, demand and service noise of its runs
+STREAMS = ['macro', 'demand', 'service', 'providers']
+
+
+def is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value) -> bool:
+    return is_int(value) or isinstance(value, float)
+
+
+def stream(params, name):
+    """
+    generator for one source of randomness: its own stream when the run has
+    them (see run.run_generators), else the run's generator
+    """
+    streams = params.get('streams')
+    if streams:
+        return streams[name]
+    return params.get('rng', np.random)
+
+
+def scale(ranges, unit):
+    """
+    maps points of the unit cube, one row per point, to dicts of values in
+    ranges ({key: (low, high)}). ranges whose bounds are both ints give ints
+    """
+    points = []
+    for row in unit:
+        point = {}
+        for (key, (low, high)), u in zip(ranges.items(), row):
+            value = low + u * (high - low)
+            point[key] = int(round(value)) if isinstance(low, int) and isinstance(high, int) else float(value)
+        points.append(point)
+    return points
+
+
+class AtomicPath:
+    """
+    temporary file next to path that only replaces path once committed, so
+    readers never see a partial file and a crash mid-write keeps the
+    previous one. as a context manager it yields the temporary path and
+    commits when the block finishes, or discards it if the block raises:
+
+        with AtomicPath(path) as tmp_path:
+            df.to_parquet(tmp_path)
+    """
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory or None, suffix='.tmp')
+        os.close(fd)
+
+    def __enter__(self):
+        return self.tmp_path
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def commit(self):
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class Antithetic:
+    """
+    generator drawing the mirror image of another generator's numbers: u
+    becomes 1 - u for uniforms and z becomes -z for normals. poisson counts
+    are passed through unchanged, as they have no exact mirror
+    """
+    def __init__(self, rng):
+        self.rng = rng
+
+    @property
+    def bit_generator(self):
+        return self.rng.bit_generator
+
+    def random(self, size=None):
+        return 1 - self.rng.random(size)
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return np.add(low, high) - self.rng.uniform(low, high, size)
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return 2 * np.asarray(loc) - self.rng.normal(loc, scale, size)
+
+    def lognormal(self, mean=0.0, sigma=1.0, size=None):
+        return np.exp(2 * np.asarray(mean)) / self.rng.lognormal(mean, sigma, size)
+
+    def poisson(self, lam=1.0, size=None):
+        return self.rng.poisson(lam, size)
@@ -0,0 +1,98 @@
+"""
+variance reduction for comparing scenarios.
+
+an A/B comparison (say percent_burned 1 against 0) is noisy when each
+scenario gets its own noise: the difference of the means carries the
+variance of both. RunOptions(crn=True) gives every source of randomness
+(macro, demand, service noise and provider sampling, see utils.STREAMS) its
+own generator per run, so two scenarios run with the same seed see the same
+macro, demand and service draws week by week, even when they draw different
+numbers of providers. noise that moves both scenarios alike then cancels in
+the difference; a variable only one scenario is exposed to (the burned supply
+when B burns nothing) gains little.
+antithetic=True additionally pairs each run with one drawing the mirrored
+numbers, which cancels noise within each scenario's mean.
+
+compare() measures what this buys: it runs both scenarios with independent
+noise and with the reduction, and reports the standard error of the
+difference under each and their variance ratio, the factor by which fewer
+runs give the same precision.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .metrics import METRICS, result_variables
+from .options import RunOptions
+from .run import CONVERGENCE_VARIABLES, execute_radcad, run_seed
+
+
+class RunValues:
+    """
+    collects the per-run values execute_radcad hands to its writer
+    """
+    def __init__(self):
+        self.runs = []
+
+    def add_runs(self, values, start=0):
+        self.runs.extend(values)
+
+    def array(self) -> np.ndarray:
+        return np.array(self.runs)
+
+
+def run_values(params, initial_state, state_update_blocks, T, R, variables, options):
+    """
+    (R, T + 1, variables) values of every run
+    """
+    collected = RunValues()
+    execute_radcad(params, initial_state, state_update_blocks, T, R, options, writer=collected)
+
+    recorded = result_variables(initial_state, options.metrics)
+    return collected.array()[:, :, [recorded.index(variable) for variable in variables]]
+
+
+def compare(params_a, params_b, initial_state, state_update_blocks, T, R, variables=CONVERGENCE_VARIABLES, seed=0, antithetic=True, processes=None, metrics=METRICS):
+    """
+    per-timestep difference A - B of the mean of every variable, with its
+    standard error under independent noise and under common random numbers
+    (plus antithetic pairs), and the variance reduction factor between them.
+    columns are (variable, 'difference' | 'se_independent' | 'se_reduced' |
+    'reduction') like the execute frame
+    """
+    if antithetic and R % 2:
+        raise ValueError("antithetic runs come in pairs, R must be even")
+    root = np.random.SeedSequence(seed)
+
+    # independent noise: each scenario spawned from its own seed
+    options_a = RunOptions(seed=run_seed(root, 0), processes=processes, metrics=metrics)
+    options_b = RunOptions(seed=run_seed(root, 1), processes=processes, metrics=metrics)
+    independent = run_values(params_a, initial_state, state_update_blocks, T, R, variables, options_a) \
+        - run_values(params_b, initial_state, state_update_blocks, T, R, variables, options_b)
+
+    # both scenarios on the same streams
+    options = RunOptions(seed=run_seed(root, 2), processes=processes, crn=True, antithetic=antithetic, metrics=metrics)
+    reduced = run_values(params_a, initial_state, state_update_blocks, T, R, variables, options) \
+        - run_values(params_b, initial_state, state_update_blocks, T, R, variables, options)
+    if antithetic:
+        # the runs of a pair are not independent, their mean is
+        reduced = (reduced[0::2] + reduced[1::2]) / 2
+
+    variance_independent = independent.var(axis=0, ddof=1) / len(independent)
+    variance_reduced = reduced.var(axis=0, ddof=1) / len(reduced)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reduction = variance_independent / variance_reduced
+
+    columns = {}
+    for i, variable in enumerate(variables):
+        columns[(variable, 'difference')] = reduced.mean(axis=0)[:, i]
+        columns[(variable, 'se_independent')] = np.sqrt(variance_independent[:, i])
+        columns[(variable, 'se_reduced')] = np.sqrt(variance_reduced[:, i])
+        columns[(variable, 'reduction')] = reduction[:, i]
+    df = pd.DataFrame(columns)
+    df.index.name = 'timestep'
+
+    summary = ', '.join(f"{variable} x{df[(variable, 'reduction')].iloc[-1]:.1f}" for variable in variables)
+    logging.info(f"variance of the final difference reduced by {summary}")
+    return df
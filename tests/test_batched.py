@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from model.options import RunOptions
+from model.params import params, initial_state
+from model.run import execute
+from model.state_update_blocks import state_update_blocks
+from model.sweep import DEMAND_TYPES
+
+VARIABLES = ['token_price', 'circulating_supply', 'num_providers', 'demand', 'total_capacity', 'service_price']
+
+
+@pytest.mark.parametrize('demand_type', DEMAND_TYPES)
+def test_batched_matches_radcad_in_distribution(demand_type):
+    T, R = 26, 60
+    params_test = params(demand_type, 'sideways', 3500, 0.5)
+    initial_state_test = initial_state(1_000_000, demand_type, seed=11)
+
+    radcad = execute(params_test, initial_state_test, state_update_blocks, T, R, RunOptions(seed=11, processes=2))
+    batched = execute(params_test, initial_state_test, state_update_blocks, T, R, RunOptions(engine='batched', seed=11))
+
+    assert batched.columns.equals(radcad.columns)
+    assert batched.index.equals(radcad.index)
+
+    # the engines draw different numbers, so their means differ by sampling
+    # error only: within 5 standard errors of the difference at every week
+    for variable in VARIABLES:
+        difference = batched[(variable, 'mean')] - radcad[(variable, 'mean')]
+        se = np.sqrt((batched[(variable, 'std')] ** 2 + radcad[(variable, 'std')] ** 2) / R)
+        assert (difference.abs() <= 5 * se + 1e-9 * radcad[(variable, 'mean')].abs()).all(), variable
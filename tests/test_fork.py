@@ -0,0 +1,18 @@
+import pytest
+
+from model.fork import branch, fork
+from model.metrics import METRICS
+from model.params import params, initial_state
+from model.state_update_blocks import state_update_blocks
+
+
+def test_fork_rejects_other_metrics_than_the_prefix(tmp_path):
+    params_test = params('growth', 'sideways', 3500, 0.5)
+    metrics = {key: METRICS[key] for key in ['num_providers', 'avg_capacity']}
+    checkpoints = branch(params_test, initial_state(1_000_000, 'growth', seed=0), state_update_blocks, 6, 2, tmp_path, seed=0, processes=1, metrics=metrics)
+
+    with pytest.raises(ValueError, match='metrics'):
+        fork(params_test, state_update_blocks, checkpoints, 10, {'baseline': {}}, processes=1)
+
+    results = fork(params_test, state_update_blocks, checkpoints, 10, {'baseline': {}}, processes=1, metrics=metrics)
+    assert len(results['baseline']) == 11
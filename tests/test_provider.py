@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from model.provider import ProviderPool
+
+DRAWS = 4000
+
+
+def onboarded(state, mode, seed):
+    rng = np.random.default_rng(seed)
+    pool = ProviderPool()
+    joiners = [pool.onboard(state, 10, rng, mode) for _ in range(DRAWS)]
+    counts = np.array([len(joiner) for joiner in joiners])
+    capacity = np.concatenate([joiner.capacity for joiner in joiners])
+    cost_per_unit = np.concatenate([joiner.cost_per_unit for joiner in joiners])
+    return counts, capacity, cost_per_unit
+
+
+def assert_same_moments(sample, thinned):
+    # means within 5 standard errors, and the same for the second moments
+    for moment in (1, 2):
+        a, b = sample ** moment, thinned ** moment
+        se = np.sqrt(a.var() / len(a) + b.var() / len(b))
+        assert abs(a.mean() - b.mean()) <= 5 * se
+
+
+@pytest.mark.parametrize('reward_per_unit', [0.06, 0.1, 0.15, 0.3])
+def test_thinned_onboarding_matches_sampled_in_distribution(reward_per_unit):
+    state = {'token_price': 1.0, 'reward_rate': reward_per_unit}
+
+    sample_counts, sample_capacity, sample_cost = onboarded(state, 'sample', seed=1)
+    thinned_counts, thinned_capacity, thinned_cost = onboarded(state, 'thinned', seed=2)
+
+    assert_same_moments(sample_counts, thinned_counts)
+    assert_same_moments(sample_capacity, thinned_capacity)
+    assert_same_moments(sample_cost, thinned_cost)
+    assert sample_cost.max() <= reward_per_unit and thinned_cost.max() <= reward_per_unit
@@ -0,0 +1,86 @@
+import pytest
+
+from model.checkpoint import Checkpoints
+from model.options import RunOptions
+from model.params import params, initial_state
+from model.run import execute, execute_adaptive
+from model.state_update_blocks import state_update_blocks
+
+
+@pytest.mark.parametrize('demand_type', ['consistent', 'volatile'])
+def test_results_match_deepcopy_mode(demand_type):
+    params_test = params(demand_type, 'sideways', 3500, 0.5)
+    initial_state_test = initial_state(1_000_000, demand_type, seed=3)
+
+    df = execute(params_test, initial_state_test, state_update_blocks, 26, 4, RunOptions(seed=3, processes=1))
+    reference = execute(params_test, initial_state_test, state_update_blocks, 26, 4, RunOptions(seed=3, processes=1, deepcopy=True))
+
+    assert df.equals(reference)
+
+
+@pytest.mark.parametrize('engine', ['radcad', 'batched'])
+@pytest.mark.parametrize('weeks', [0, -1, 2.5])
+def test_invalid_lookback_weeks_are_rejected(engine, weeks):
+    params_test = {**params('growth', 'bullish', 3500, 0.5), 'provider_lookback_weeks': weeks}
+    initial_state_test = initial_state(1_000_000, 'growth', seed=5)
+
+    with pytest.raises(ValueError, match='Invalid lookback weeks'):
+        execute(params_test, initial_state_test, state_update_blocks, 4, 2, RunOptions(engine=engine, seed=5, processes=1))
+
+
+@pytest.mark.parametrize('min_runs, max_runs', [(1, 10), (0, 10), (10, 5)])
+def test_invalid_adaptive_run_limits_are_rejected(min_runs, max_runs):
+    params_test = params('growth', 'bullish', 3500, 0.5)
+    initial_state_test = initial_state(1_000_000, 'growth', seed=5)
+
+    with pytest.raises(ValueError):
+        execute_adaptive(params_test, initial_state_test, state_update_blocks, 4, RunOptions(seed=5, processes=1), min_runs=min_runs, max_runs=max_runs)
+
+
+def test_serial_and_parallel_runs_match():
+    params_test = params('growth', 'bullish', 3500, 0.5)
+    initial_state_test = initial_state(1_000_000, 'growth', seed=5)
+
+    serial = execute(params_test, initial_state_test, state_update_blocks, 26, 6, RunOptions(seed=5, processes=1))
+    parallel = execute(params_test, initial_state_test, state_update_blocks, 26, 6, RunOptions(seed=5, processes=3))
+
+    assert serial.equals(parallel)
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingCheckpoints(Checkpoints):
+    """
+    checkpoints that crash the simulation the nth time a run reaches week
+    """
+    def __init__(self, directory, every, week, nth=1):
+        super().__init__(directory, every)
+        self.week = week
+        self.remaining = nth
+
+    def due(self, timestep, T):
+        if timestep == self.week:
+            self.remaining -= 1
+            if self.remaining == 0:
+                raise Crash(timestep)
+        return super().due(timestep, T)
+
+
+@pytest.mark.parametrize('engine', ['radcad', 'batched'])
+def test_resumed_run_matches_uninterrupted(tmp_path, engine):
+    params_test = params('volatile', 'bearish', 3500, 0.5)
+    initial_state_test = initial_state(1_000_000, 'volatile', seed=7)
+    options = RunOptions(engine=engine, seed=7, processes=1)
+
+    reference = execute(params_test, initial_state_test, state_update_blocks, 40, 4, options)
+
+    # the second radCAD run crashes at week 17, after its week 15 snapshot
+    checkpoints = CrashingCheckpoints(tmp_path, every=5, week=17, nth=2 if engine == 'radcad' else 1)
+    with pytest.raises(Crash):
+        execute(params_test, initial_state_test, state_update_blocks, 40, 4, options, checkpoints=checkpoints)
+    assert checkpoints.load('run-2' if engine == 'radcad' else 'batched')['timestep'] == 15
+
+    df = execute(params_test, initial_state_test, state_update_blocks, 40, 4, options, resume_from=tmp_path)
+    assert df.equals(reference)
@@ -0,0 +1,38 @@
+import pytest
+
+from model.scenarios import load_scenarios
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'scenarios.toml'
+    path.write_text(text)
+    return path
+
+
+def test_scenarios_take_the_file_defaults(tmp_path):
+    path = write(tmp_path, 'T = 10\nengine = "batched"\n[params]\nmax_mint = 1\n[[scenario]]\nname = "a"\n[scenario.params]\npercent_burned = 1.0\n[[scenario]]\ndemand_type = "growth"\n')
+    first, second = load_scenarios(path)
+
+    assert (first['name'], first['T'], first['engine']) == ('a', 10, 'batched')
+    assert first['params'] == {'max_mint': 1, 'percent_burned': 1.0}
+    assert (second['name'], second['demand_type']) == ('scenarios-2', 'growth')
+
+
+@pytest.mark.parametrize('text', [
+    'demand_type = "boom"',
+    'macro_condition = "flat"',
+    'max_mint = "lots"',
+    'provider_model = "swarm"',
+    'engine = "fast"',
+    'T = 0',
+    'R = 2.5',
+    'seed = -1',
+    'params = 3',
+    'name = "../escape"',
+    'name = "a/b"',
+    'name = ".."',
+    'colour = "red"',
+])
+def test_invalid_scenarios_are_rejected(tmp_path, text):
+    with pytest.raises(ValueError):
+        load_scenarios(write(tmp_path, text))
@@ -0,0 +1,91 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from model.cache import ResultCache
+from model.service import ServiceClient, start_server
+
+CONFIG = {'demand_type': 'growth', 'macro_condition': 'bearish', 'max_mint': 3500, 'percent_burned': 0.5, 'initial_supply': 1_000_000}
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('service')
+    server = start_server(port=0, workers=2, cache=ResultCache(directory / 'cache'), results=ResultCache(directory / 'jobs', max_bytes=None))
+    yield server
+    server.shutdown()
+    server.service.shutdown()
+
+
+def post(server, content):
+    """
+    status code and reply of POST /jobs
+    """
+    request = urllib.request.Request(f"{server.url}/jobs", data=json.dumps(content).encode(), method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def wait(client, job_id, states=('done', 'failed', 'cancelled')):
+    for _ in range(600):
+        status = client.status(job_id)
+        if status['state'] in states:
+            return status
+        time.sleep(0.1)
+    raise TimeoutError(job_id)
+
+
+@pytest.mark.parametrize('spec', [
+    [1, 2],
+    {'config': {'demand_type': 'growth'}},
+    {'config': {**CONFIG, 'demand_type': 'boom'}},
+    {'config': {**CONFIG, 'max_mint': 'x'}},
+    {'config': CONFIG, 'T': 0},
+    {'config': CONFIG, 'seed': -1},
+    {'config': CONFIG, 'settings': {'foo': 1}},
+    {'config': CONFIG, 'settings': {'engine': 'fast'}},
+    {'config': CONFIG, 'settings': {'tolerance': -0.1}},
+    {'config': CONFIG, 'settings': {'tolerance': {'token_price': 0.1}}},
+    {'config': CONFIG, 'settings': {'confidence': 1.5}},
+    {'config': CONFIG, 'settings': {'min_runs': 1}},
+    {'config': CONFIG, 'settings': {'min_runs': 20, 'max_runs': 10}},
+    {'config': CONFIG, 'settings': {'max_runs': 5.5}},
+    {'config': CONFIG, 'settings': {'variables': 'token_price'}},
+])
+def test_invalid_jobs_are_rejected(server, spec):
+    code, reply = post(server, spec)
+    assert code == 400
+    assert reply['error']
+
+
+def test_identical_jobs_are_simulated_once(server):
+    client = ServiceClient(server.url)
+    spec = {'config': CONFIG, 'T': 12, 'seed': 0, 'settings': {'engine': 'batched', 'max_runs': 20}}
+
+    code, first = post(server, spec)
+    assert code == 202
+    code, second = post(server, json.loads(json.dumps(spec)))
+    assert second['id'] == first['id']
+    assert len(server.service.jobs) <= 1
+
+    assert wait(client, first['id'])['state'] == 'done'
+    code, again = post(server, spec)
+    assert code == 200 and again['id'] == first['id']
+    assert len(client.result(first['id'])) == 13
+
+
+def test_cancelled_job_stops(server):
+    client = ServiceClient(server.url)
+    job_id = client.submit(CONFIG, 520, seed=1, tolerance=0.0001, max_runs=100_000)
+
+    wait(client, job_id, states=('running',))
+    client.cancel(job_id)
+    assert wait(client, job_id)['state'] == 'cancelled'
+    with pytest.raises(LookupError):
+        client.result(job_id)